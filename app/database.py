@@ -1,5 +1,8 @@
-from tortoise import Tortoise
+from tortoise import Tortoise, connections
+from tortoise.backends.base.config_generator import expand_db_url
 from dotenv import load_dotenv
+from urllib.parse import urlparse
+import asyncio
 import os
 
 load_dotenv()
@@ -12,13 +15,66 @@ SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
 # on the fly so that the application can start without requiring the developer
 # to manually edit their environment variables.
 
-if SUPABASE_DB_URL and SUPABASE_DB_URL.startswith("postgresql://"):
-    SUPABASE_DB_URL = SUPABASE_DB_URL.replace("postgresql://", "postgres://", 1)
+def _normalize_scheme(db_url: str | None) -> str | None:
+    if db_url and db_url.startswith("postgresql://"):
+        return db_url.replace("postgresql://", "postgres://", 1)
+    return db_url
+
+SUPABASE_DB_URL = _normalize_scheme(SUPABASE_DB_URL)
+
+# Optional read replica. Pure reads are routed to it through `get_read_db()`;
+# without it every query goes to the primary.
+SUPABASE_DB_REPLICA_URL = _normalize_scheme(os.getenv("SUPABASE_DB_REPLICA_URL"))
+READ_CONNECTION = "replica" if SUPABASE_DB_REPLICA_URL else "default"
+
+# Connection pool settings. asyncpg defaults assume a direct Postgres
+# connection and a single worker, so everything is tunable per deployment.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Tortoise checks connections out of the pool without a timeout, so this bounds
+# pool acquisition in the startup warm-up and health check.
+DB_ACQUIRE_TIMEOUT = float(os.getenv("DB_ACQUIRE_TIMEOUT", "10"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+
+# Supabase's pooler (pgbouncer in transaction mode, port 6543) hands each
+# transaction to an arbitrary server connection, so named prepared statements
+# cached by asyncpg would break. Disable the statement cache in that case.
+_SUPABASE_POOLER_PORT = 6543
+
+
+def _uses_pgbouncer(db_url: str) -> bool:
+    flag = os.getenv("DB_PGBOUNCER")
+    if flag is not None:
+        return flag.lower() in ("1", "true", "yes")
+    return urlparse(db_url).port == _SUPABASE_POOLER_PORT
+
+
+def build_connection_config(db_url: str | None) -> dict | str | None:
+    """Expand a database URL into a Tortoise connection config with pool settings."""
+    if not db_url:
+        return db_url
+
+    config = expand_db_url(db_url)
+    default_cache_size = "0" if _uses_pgbouncer(db_url) else "100"
+    config["credentials"].update({
+        "minsize": DB_POOL_MIN_SIZE,
+        "maxsize": DB_POOL_MAX_SIZE,
+        "timeout": DB_CONNECT_TIMEOUT,
+        "command_timeout": DB_COMMAND_TIMEOUT,
+        "max_inactive_connection_lifetime": DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+        "statement_cache_size": int(os.getenv("DB_STATEMENT_CACHE_SIZE", default_cache_size)),
+    })
+    return config
+
+
+_connections = {"default": build_connection_config(SUPABASE_DB_URL)}
+if SUPABASE_DB_REPLICA_URL:
+    _connections["replica"] = build_connection_config(SUPABASE_DB_REPLICA_URL)
 
 TORTOISE_ORM = {
-    "connections": {
-        "default": SUPABASE_DB_URL
-    },
+    "connections": _connections,
     "apps": {
         "models": {
             "models": [
@@ -45,3 +101,39 @@ async def init_db():
 
 async def close_db():
     await Tortoise.close_connections()
+
+def get_write_db():
+    """Connection for writes and read-after-write paths (always the primary)."""
+    return connections.get("default")
+
+def get_read_db():
+    """Connection for pure reads that tolerate replication lag."""
+    return connections.get(READ_CONNECTION)
+
+async def check_db_health(connection_name: str = "default") -> bool:
+    """Run a trivial query, bounded by the acquire timeout."""
+    try:
+        await asyncio.wait_for(
+            connections.get(connection_name).execute_query("SELECT 1"),
+            timeout=DB_ACQUIRE_TIMEOUT,
+        )
+        return True
+    except Exception as e:
+        print(f"Database health check failed: {e}")
+        return False
+
+async def warm_db_pool():
+    """Open the pool eagerly so the first requests don't pay for connecting.
+
+    Runs `DB_POOL_MIN_SIZE` health checks concurrently per connection (primary
+    and replica), which makes each pool create and validate that many
+    connections.
+    """
+    results = await asyncio.gather(*(
+        check_db_health(name)
+        for name in TORTOISE_ORM["connections"]
+        for _ in range(DB_POOL_MIN_SIZE)
+    ))
+    if not all(results):
+        raise RuntimeError("Database health check failed during startup")
+    print(f"Database pool warmed ({DB_POOL_MIN_SIZE} connections)")
@@ -1,27 +1,109 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, couples, messages, users, sessions
-from app.database import init_db, close_db
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from app.routers import auth, couples, debug, memories, messages, users, sessions
+from app.database import init_db, close_db, warm_db_pool
+from app.monitoring.loop_watchdog import LOOP_WATCHDOG_ENABLED, loop_watchdog
+from app.monitoring.query_counter import (
+    QUERY_COUNTER_ENABLED,
+    QueryCounterMiddleware,
+    install_query_counter,
+)
+from app.monitoring.tracing import (
+    TRACING_ENABLED,
+    TracingMiddleware,
+    install_tracing,
+    shutdown_tracing,
+)
+from app.monitoring.profiler import PROFILER_ENABLED, ProfilerMiddleware
+from app.services.compaction_service import (
+    MEMORY_COMPACTION_ENABLED,
+    MEMORY_COMPACTION_INTERVAL,
+    compact_memories,
+)
+from app.services.email_filter import (
+    EMAIL_FILTER_ENABLED,
+    EMAIL_FILTER_REFRESH_INTERVAL,
+    refresh_email_filter,
+)
+from app.services.partition_service import (
+    MESSAGE_PARTITION_INTERVAL,
+    MESSAGE_PARTITION_MAINTENANCE_ENABLED,
+    maintain_message_partitions,
+)
+from app.services.receipt_service import flush_receipts
+from app.services.session_service import (
+    SESSION_EXPIRY_ENABLED,
+    SESSION_EXPIRY_INTERVAL,
+    expire_idle_sessions,
+)
+from app.services.scheduler import start_periodic_task, stop_periodic_tasks
 from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Compress larger responses (message history, exports) for clients that accept gzip
+GZIP_ENABLED = os.getenv("GZIP_ENABLED", "false").lower() == "true"
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", "1000"))
+
+
+class ExportAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that passes the gzip=true export through untouched.
+
+    That response is a .gz file (application/gzip, no Content-Encoding), which
+    older Starlette releases would compress a second time.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/messages/export":
+            query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+            if query.get("gzip", ["false"])[-1].lower() in ("1", "true", "t", "on", "yes", "y"):
+                await self.app(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await warm_db_pool()
+    if LOOP_WATCHDOG_ENABLED:
+        loop_watchdog.start()
+    # Background jobs. Compaction and archival belong on one worker / instance
+    # only; partition upkeep, session expiry and the email filter are safe to
+    # run everywhere (the filter is per worker).
+    if MEMORY_COMPACTION_ENABLED:
+        start_periodic_task(
+            "memory_compaction", MEMORY_COMPACTION_INTERVAL, compact_memories,
+            initial_delay=60,
+        )
+    if MESSAGE_PARTITION_MAINTENANCE_ENABLED:
+        start_periodic_task(
+            "message_partitions", MESSAGE_PARTITION_INTERVAL, maintain_message_partitions,
+        )
+    if SESSION_EXPIRY_ENABLED:
+        start_periodic_task("session_expiry", SESSION_EXPIRY_INTERVAL, expire_idle_sessions)
+    if EMAIL_FILTER_ENABLED:
+        start_periodic_task("email_filter", EMAIL_FILTER_REFRESH_INTERVAL, refresh_email_filter)
     yield
     # Shutdown
+    await stop_periodic_tasks()
+    await loop_watchdog.stop()
+    await flush_receipts()
     await close_db()
+    shutdown_tracing()
 
 app = FastAPI(
     title="Third Wheel - Couples Therapy MVP",
     description="A couples therapy platform API",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Add CORS middleware
@@ -37,12 +119,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if GZIP_ENABLED:
+    app.add_middleware(ExportAwareGZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
+# Per-request DB query counts; exposed as response headers with the debug routes
+if QUERY_COUNTER_ENABLED:
+    install_query_counter()
+    app.add_middleware(QueryCounterMiddleware, headers=debug.DEBUG_ENDPOINTS_ENABLED)
+
+# Sampling profiler for a fraction of requests (opt-in, see SETUP.md)
+if PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Request spans; added last so the span covers the other middlewares
+if TRACING_ENABLED:
+    install_tracing()
+    app.add_middleware(TracingMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(couples.router)
 app.include_router(messages.router)
+app.include_router(memories.router)
 app.include_router(sessions.router)
+if debug.DEBUG_ENDPOINTS_ENABLED:
+    app.include_router(debug.router)
 
 @app.get("/")
 async def root():
@@ -11,6 +11,8 @@ class Message(Model):
     reply_to_message_id = fields.IntField(null=True)  # For threading, may be if needed
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
+    # "search_vector" (generated tsvector over content, GIN indexed) exists only
+    # in the database and is used by memory_service.PostgresMessageSearch
     
     class Meta:
         table = "messages"
@@ -12,6 +12,10 @@ class Session(Model):
     current_participants = fields.IntField(default=1)  
     status = fields.CharField(max_length=20, default="active")  # "active", "completed", etc.
     max_participants = fields.IntField(default=2)
+    # Rolling summary of the conversation, maintained by summary_service
+    summary = fields.TextField(null=True)
+    summary_message_id = fields.IntField(null=True)  # Last message covered by the summary
+    summary_updated_at = fields.DatetimeField(null=True)
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
     
@@ -26,20 +30,3 @@ class Session(Model):
     def generate_session_code(cls) -> str:
         """Generate a unique 8-character session code."""
         return ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(8))
-    
-    async def add_participant(self, user_id: int) -> bool:
-        """Add a participant to the session if there's space."""
-        # Ensure we don't exceed the maximum allowed participants
-        if self.current_participants >= self.max_participants:
-            return False
-        self.current_participants += 1
-        await self.save(update_fields=["current_participants"])
-        return True
-    
-    async def remove_participant(self, user_id: int) -> bool:
-        """Remove a participant from the session."""
-        if self.current_participants > 0:
-            self.current_participants -= 1
-            await self.save(update_fields=["current_participants"])
-            return True
-        return False
@@ -0,0 +1,7 @@
+def endpoint_name(scope) -> str:
+    """"METHOD /route/{param}" of a request, once routing has run.
+
+    Unmatched paths share one name so scanners can't grow per-endpoint state.
+    """
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', None) or '<unmatched>'}"
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.schemas import BlockedLoopStack, EventLoopMetrics
+from app.services.log_utils import log_message
+
+# Event loop lag watchdog. A task on the loop wakes every LOOP_LAG_INTERVAL
+# seconds and records how late it woke up; that lag is what every other
+# coroutine waited too. A thread watches the task's heartbeat and, once the
+# loop has not come back for LOOP_BLOCK_THRESHOLD seconds, captures the loop
+# thread's stack: the blocking call is at the bottom of it. Off by default like
+# the query counter and tracing; enabled through the environment in staging.
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "false").lower() == "true"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", "0.05"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+# Lag samples kept for the percentiles (1200 x 50ms = the last minute)
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "1200"))
+LOOP_BLOCK_STACKS = int(os.getenv("LOOP_BLOCK_STACKS", "20"))
+LOOP_BLOCK_STACK_DEPTH = 20
+
+
+def _percentile(ordered: list, fraction: float) -> float:
+    return ordered[round(fraction * (len(ordered) - 1))] if ordered else 0.0
+
+
+class LoopWatchdog:
+    def __init__(self, interval: float, threshold: float, window: int, stacks: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.lags: deque = deque(maxlen=window)
+        self.blocks: deque = deque(maxlen=stacks)
+        self.blocked_count = 0
+        self.blocked_seconds = 0.0
+        self._heartbeat = time.monotonic()
+        self._pending: Optional[BlockedLoopStack] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick(), name="loop_watchdog")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        log_message("INFO", f"Event loop watchdog started (blocking threshold {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        task, self._task = self._task, None
+        self._stopped.set()
+        if task:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _tick(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(now - expected, 0.0)
+            self.lags.append(lag)
+            if lag < self.threshold:
+                continue
+            self.blocked_count += 1
+            self.blocked_seconds += lag
+            block, self._pending = self._pending, None
+            if block is not None:
+                block.duration_ms = round(lag * 1000, 1)
+                log_message("WARNING", f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    def _watch(self):
+        # Check often enough to catch a block while it is still going on
+        while not self._stopped.wait(self.threshold / 2):
+            if self._pending is not None:
+                continue
+            if time.monotonic() - self._heartbeat < self.threshold + self.interval:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            stack = traceback.format_stack(frame)[-LOOP_BLOCK_STACK_DEPTH:]
+            block = BlockedLoopStack(at=datetime.now(timezone.utc), stack=[line.rstrip() for line in stack])
+            self._pending = block
+            self.blocks.append(block)
+            log_message(
+                "WARNING",
+                f"Event loop blocked for over {self.threshold * 1000:.0f}ms in:\n" + "".join(stack).rstrip(),
+            )
+
+    def snapshot(self) -> EventLoopMetrics:
+        ordered = sorted(self.lags)
+        return EventLoopMetrics(
+            samples=len(ordered),
+            lag_p50_ms=round(_percentile(ordered, 0.5) * 1000, 2),
+            lag_p90_ms=round(_percentile(ordered, 0.9) * 1000, 2),
+            lag_p99_ms=round(_percentile(ordered, 0.99) * 1000, 2),
+            lag_max_ms=round((ordered[-1] if ordered else 0.0) * 1000, 2),
+            blocked_count=self.blocked_count,
+            blocked_seconds=round(self.blocked_seconds, 3),
+            recent_blocks=list(self.blocks),
+        )
+
+
+loop_watchdog = LoopWatchdog(LOOP_LAG_INTERVAL, LOOP_BLOCK_THRESHOLD, LOOP_LAG_WINDOW, LOOP_BLOCK_STACKS)
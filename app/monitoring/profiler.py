@@ -0,0 +1,196 @@
+import asyncio
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from app.monitoring.endpoints import endpoint_name
+from app.services.log_utils import log_message
+
+# Sampling profiler for individual requests. A background thread looks at
+# every profiled request PROFILER_INTERVAL seconds: if the request's task is
+# running it records the event loop thread's stack, otherwise the chain of
+# coroutines it is suspended in (ending in "[await]"), so both CPU time and
+# time spent waiting on the DB, mem0 or the LLM show up. Samples are appended
+# per endpoint to PROFILER_DIR/<METHOD>_<path>.folded in the folded-stack
+# format read by flamegraph.pl, speedscope and inferno.
+#
+# Requests are profiled at random (PROFILER_SAMPLE_RATE) or when they send
+# the PROFILER_HEADER header with PROFILER_TOKEN as the value. Outside
+# development the header is ignored while no token is set, so clients can't
+# switch profiling on for themselves.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_SAMPLE_RATE = float(os.getenv("PROFILER_SAMPLE_RATE", "0.01"))
+PROFILER_HEADER = os.getenv("PROFILER_HEADER", "x-profile").lower()
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILER_HEADER_ENABLED = bool(PROFILER_TOKEN) or os.getenv("ENVIRONMENT") == "development"
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+PROFILER_DIR = os.getenv("PROFILER_DIR", "profiles")
+# Each endpoint file is rotated at PROFILER_MAX_FILE_BYTES, keeping
+# PROFILER_MAX_FILES files (<name>.folded, <name>.folded.1, ...)
+PROFILER_MAX_FILE_BYTES = int(os.getenv("PROFILER_MAX_FILE_BYTES", str(5 * 1024 * 1024)))
+PROFILER_MAX_FILES = int(os.getenv("PROFILER_MAX_FILES", "5"))
+PROFILER_MAX_DEPTH = 128
+
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+_CWD = os.getcwd()
+_labels: Dict[object, str] = {}
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        name = getattr(code, "co_qualname", code.co_name)
+        filename = code.co_filename
+        filename = os.path.relpath(filename, _CWD) if filename.startswith(_CWD) else os.path.basename(filename)
+        # ";" separates frames in the folded format, keep it out of labels
+        label = _labels[code] = f"{name} ({filename}:{code.co_firstlineno})".replace(";", ",")
+    return label
+
+
+def _running_stack(frame, root) -> List[str]:
+    """Labels from `root` (the task's coroutine frame) down to `frame`."""
+    stack = []
+    while frame is not None and len(stack) < PROFILER_MAX_DEPTH:
+        stack.append(_frame_label(frame.f_code))
+        if frame is root:
+            break
+        frame = frame.f_back
+    else:
+        # The loop is running something else inside this task's step
+        if frame is None:
+            return []
+    stack.reverse()
+    return stack
+
+
+def _suspended_stack(coro) -> List[str]:
+    """Labels of the chain of coroutines a suspended task is awaiting in."""
+    stack = []
+    while coro is not None and len(stack) < PROFILER_MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    stack.append("[await]")
+    return stack
+
+
+class RequestProfile:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.samples: Counter = Counter()
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered asyncio tasks from a background thread."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[asyncio.Task, RequestProfile] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, task: asyncio.Task) -> RequestProfile:
+        profile = RequestProfile(task)
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+            self._active[task] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: RequestProfile) -> Counter:
+        with self._lock:
+            self._active.pop(profile.task, None)
+        return profile.samples
+
+    def _run(self):
+        # The thread exits once nothing is being profiled and is restarted
+        # by the next start()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                self._sample()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        running = asyncio.current_task(self._loop)
+        for task, profile in self._active.items():
+            coro = task.get_coro()
+            if task is running:
+                stack = _running_stack(frame, getattr(coro, "cr_frame", None))
+            else:
+                stack = _suspended_stack(coro)
+            if stack:
+                profile.samples[";".join(stack)] += 1
+
+
+profiler = SamplingProfiler(PROFILER_INTERVAL)
+
+
+def _rotate(path: str):
+    for index in range(PROFILER_MAX_FILES - 1, 0, -1):
+        source = f"{path}.{index - 1}" if index > 1 else path
+        if os.path.exists(source):
+            os.replace(source, f"{path}.{index}")
+    if PROFILER_MAX_FILES <= 1 and os.path.exists(path):
+        os.remove(path)
+
+
+def write_folded(endpoint: str, samples: Counter):
+    """Append samples to the endpoint's folded-stack file, rotating it when full."""
+    os.makedirs(PROFILER_DIR, exist_ok=True)
+    path = os.path.join(PROFILER_DIR, _UNSAFE_FILENAME.sub("_", endpoint).strip("_") + ".folded")
+    data = "".join(f"{endpoint};{stack} {count}\n" for stack, count in samples.items()).encode()
+    if os.path.exists(path) and os.path.getsize(path) + len(data) > PROFILER_MAX_FILE_BYTES:
+        _rotate(path)
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware, so the endpoint runs in the task being sampled."""
+
+    def __init__(self, app):
+        self.app = app
+        if not PROFILER_HEADER_ENABLED:
+            log_message("WARNING", f"PROFILER_TOKEN is not set: ignoring the {PROFILER_HEADER} header")
+
+    def _should_profile(self, scope) -> bool:
+        if PROFILER_HEADER_ENABLED:
+            for name, value in scope.get("headers", ()):
+                if name.decode("latin-1") == PROFILER_HEADER:
+                    return value.decode("latin-1") == PROFILER_TOKEN if PROFILER_TOKEN else value != b"0"
+        return random.random() < PROFILER_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(asyncio.current_task())
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            samples = profiler.stop(profile)
+            endpoint = endpoint_name(scope)
+            if samples:
+                try:
+                    await asyncio.to_thread(write_folded, endpoint, samples)
+                except OSError as e:
+                    log_message("ERROR", f"Could not write profile for {endpoint}: {e!r}")
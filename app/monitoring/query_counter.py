@@ -0,0 +1,135 @@
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional
+
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+
+from app.monitoring.endpoints import endpoint_name
+from app.schemas import EndpointQueryStats
+from app.services.log_utils import log_message
+
+# Per-request DB query accounting. The Tortoise asyncpg client's execute_*
+# methods are wrapped to add every statement (ORM or raw SQL) and its time to
+# the stats of the request running it, tracked in a context variable so tasks
+# spawned by the request count too. Requests going over QUERY_BUDGET
+# statements, or running one statement shape QUERY_REPEAT_THRESHOLD times
+# (an N+1 loop), are logged.
+QUERY_COUNTER_ENABLED = os.getenv("QUERY_COUNTER_ENABLED", "false").lower() == "true"
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "10"))
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+EXECUTE_METHODS = ("execute_insert", "execute_many", "execute_query", "execute_query_dict", "execute_script")
+
+# Literals and parameter lists vary between runs of the same statement
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_PARAMETER_LISTS = re.compile(r"\$\d+(?:\s*,\s*\$\d+)*")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(query: str) -> str:
+    shape = _PARAMETER_LISTS.sub("?", _LITERALS.sub("?", query))
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Totals per endpoint for /debug/metrics (per worker process)
+_endpoints: Dict[str, EndpointQueryStats] = {}
+
+
+def _counted(method):
+    @wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return await method(self, query, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await method(self, query, *args, **kwargs)
+        finally:
+            stats.count += 1
+            stats.seconds += time.perf_counter() - started
+            stats.statements[query] += 1
+    wrapper.__query_counted__ = True
+    return wrapper
+
+
+def install_query_counter():
+    """Wrap the asyncpg client methods that send statements (idempotent)."""
+    for cls in (AsyncpgDBClient, TransactionWrapper):
+        for name in EXECUTE_METHODS:
+            # TransactionWrapper inherits the wrapped methods it doesn't override
+            if cls is TransactionWrapper and name not in cls.__dict__:
+                continue
+            method = getattr(cls, name)
+            if not getattr(method, "__query_counted__", False):
+                setattr(cls, name, _counted(method))
+
+
+def get_endpoint_query_stats() -> Dict[str, EndpointQueryStats]:
+    return dict(_endpoints)
+
+
+def _record(endpoint: str, stats: QueryStats):
+    totals = _endpoints.setdefault(endpoint, EndpointQueryStats())
+    totals.requests += 1
+    totals.queries += stats.count
+    totals.queries_max = max(totals.queries_max, stats.count)
+    totals.db_time_ms = round(totals.db_time_ms + stats.seconds * 1000, 1)
+
+    if stats.count > QUERY_BUDGET:
+        log_message(
+            "WARNING",
+            f"{endpoint} ran {stats.count} queries ({stats.seconds * 1000:.0f}ms), budget is {QUERY_BUDGET}",
+        )
+    shapes: Counter = Counter()
+    for query, count in stats.statements.items():
+        shapes[statement_shape(query)] += count
+    for shape, count in shapes.items():
+        if count >= QUERY_REPEAT_THRESHOLD:
+            log_message("WARNING", f"{endpoint} ran the same statement {count}x (N+1?): {shape[:300]}")
+
+
+class QueryCounterMiddleware:
+    """Pure ASGI middleware collecting the query stats of each request.
+
+    With `headers`, responses carry X-DB-Queries and X-DB-Time-Ms as of when
+    the response started (background tasks run after that).
+    """
+
+    def __init__(self, app, headers: bool = False):
+        self.app = app
+        self.headers = headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if self.headers else send)
+        finally:
+            _current.reset(token)
+            _record(endpoint_name(scope), stats)
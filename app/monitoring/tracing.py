@@ -0,0 +1,322 @@
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+import orjson
+from tortoise.backends.asyncpg.client import AsyncpgDBClient, TransactionWrapper
+
+from app.monitoring.endpoints import endpoint_name
+from app.monitoring.query_counter import EXECUTE_METHODS, statement_shape
+from app.services.log_utils import log_message
+
+# Minimal tracing with OpenTelemetry's data model: spans carry W3C trace and
+# span ids, nest through a context variable (so tasks, BackgroundTasks and
+# asyncio.to_thread calls started inside a span continue its trace), and are
+# exported as OTLP/JSON. The "file" exporter appends one ExportTraceService
+# request per line to TRACING_FILE, which the OpenTelemetry Collector's
+# otlpjsonfile receiver can replay into Jaeger, Tempo, ...; the "memory"
+# exporter keeps the last TRACING_MEMORY_SPANS spans for GET /debug/traces.
+# No collector or SDK is needed.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACING_EXPORTERS = {name.strip() for name in os.getenv("TRACING_EXPORTER", "file").split(",") if name.strip()}
+TRACING_FILE = os.getenv("TRACING_FILE", "traces/spans.jsonl")
+TRACING_MAX_FILE_BYTES = int(os.getenv("TRACING_MAX_FILE_BYTES", str(50 * 1024 * 1024)))  # Then rotated to .1
+TRACING_MEMORY_SPANS = int(os.getenv("TRACING_MEMORY_SPANS", "5000"))
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))  # Of traces started here
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "tw-backend")
+
+# OTLP span kinds and status codes
+KIND_INTERNAL, KIND_SERVER, KIND_CLIENT = 1, 2, 3
+STATUS_OK, STATUS_ERROR = 1, 2
+
+
+def _attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        kind: int,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        attributes: Dict[str, Any],
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_span_id = parent_span_id
+        self.attributes = attributes
+        self.events: List[Dict[str, Any]] = []
+        self.status_code = STATUS_OK
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_exception(self, error: BaseException):
+        self.status_code = STATUS_ERROR
+        self.status_message = repr(error)
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": [
+                _attribute("exception.type", type(error).__name__),
+                _attribute("exception.message", str(error)),
+            ],
+        })
+
+    def end(self):
+        """Finish and export the span; later calls do nothing."""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _export(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status_code, "message": self.status_message},
+        }
+        if self.parent_span_id:
+            otlp["parentSpanId"] = self.parent_span_id
+        if self.events:
+            otlp["events"] = self.events
+        return otlp
+
+
+class _RemoteParent:
+    """Span context received in a traceparent header."""
+
+    def __init__(self, trace_id: str, span_id: str):
+        self.trace_id = trace_id
+        self.span_id = span_id
+
+
+# Stands in for the current span inside a trace that was not sampled
+_UNSAMPLED = object()
+_current_span: ContextVar[Any] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    active = _current_span.get()
+    return active if isinstance(active, Span) else None
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, parent: Any = None, **attributes):
+    """Run the block in a child span of the current one (or a new trace).
+
+    Yields None when tracing is off or the trace isn't sampled, so callers
+    that set attributes check for that.
+    """
+    parent = parent or _current_span.get()
+    if not TRACING_ENABLED or parent is _UNSAMPLED:
+        yield None
+        return
+    if parent is None and random.random() >= TRACING_SAMPLE_RATE:
+        token = _current_span.set(_UNSAMPLED)
+        try:
+            yield None
+        finally:
+            _current_span.reset(token)
+        return
+
+    trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+    current = Span(name, kind, trace_id, parent.span_id if parent else None, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def traced(name: str, kind: int = KIND_INTERNAL):
+    """Decorator running an async function in a span."""
+    def decorator(function):
+        @wraps(function)
+        async def wrapper(*args, **kwargs):
+            with span(name, kind):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Exporters. Spans are queued and written by a thread, off the event loop.
+_memory_spans: deque = deque(maxlen=TRACING_MEMORY_SPANS)
+_file_queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _export(finished: Span):
+    otlp = finished.to_otlp()
+    if "memory" in TRACING_EXPORTERS:
+        _memory_spans.append(otlp)
+    if "file" in TRACING_EXPORTERS:
+        _ensure_writer()
+        _file_queue.put(otlp)
+
+
+def _ensure_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_spans, name="span-exporter", daemon=True)
+            _writer.start()
+
+
+def _write_batch(spans: List[Dict[str, Any]]):
+    line = orjson.dumps({"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", TRACING_SERVICE_NAME)]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+    }]}) + b"\n"
+    os.makedirs(os.path.dirname(TRACING_FILE) or ".", exist_ok=True)
+    if os.path.exists(TRACING_FILE) and os.path.getsize(TRACING_FILE) + len(line) > TRACING_MAX_FILE_BYTES:
+        os.replace(TRACING_FILE, f"{TRACING_FILE}.1")
+    with open(TRACING_FILE, "ab") as f:
+        f.write(line)
+
+
+def _write_spans():
+    # One line per batch: whatever finished while the previous write ran
+    stop = False
+    while not stop:
+        batch = [_file_queue.get()]
+        while not _file_queue.empty() and len(batch) < 512:
+            batch.append(_file_queue.get())
+        stop = None in batch
+        spans = [s for s in batch if s is not None]
+        if spans:
+            try:
+                _write_batch(spans)
+            except OSError as e:
+                log_message("ERROR", f"Could not write {len(spans)} spans: {e!r}")
+
+
+def shutdown_tracing():
+    """Write out queued spans and stop the exporter thread."""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        _file_queue.put(None)
+        writer.join(timeout=5)
+
+
+def get_recent_spans(trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Spans held by the memory exporter, optionally of one trace."""
+    return [s for s in list(_memory_spans) if trace_id is None or s["traceId"] == trace_id]
+
+
+# Instrumentation
+def _traced_query(method):
+    @wraps(method)
+    async def wrapper(self, query, *args, **kwargs):
+        if not isinstance(_current_span.get(), Span):
+            return await method(self, query, *args, **kwargs)
+        operation = query.lstrip().split(None, 1)[0].upper() if query.strip() else "QUERY"
+        with span(
+            f"db {operation}", KIND_CLIENT,
+            **{"db.system": "postgresql", "db.operation": operation, "db.statement": statement_shape(query)[:2000]},
+        ):
+            return await method(self, query, *args, **kwargs)
+    wrapper.__traced__ = True
+    return wrapper
+
+
+def install_tracing():
+    """Trace every statement sent by the Tortoise asyncpg client (idempotent)."""
+    for cls in (AsyncpgDBClient, TransactionWrapper):
+        for name in EXECUTE_METHODS:
+            if cls is TransactionWrapper and name not in cls.__dict__:
+                continue
+            method = getattr(cls, name)
+            if not getattr(method, "__traced__", False):
+                setattr(cls, name, _traced_query(method))
+
+
+def _parse_traceparent(value: str) -> Optional[_RemoteParent]:
+    # version-trace_id-parent_id-flags; unsampled remote traces start fresh
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or not int(parts[3], 16) & 1:
+        return None
+    return _RemoteParent(parts[1], parts[2])
+
+
+class TracingMiddleware:
+    """Pure ASGI middleware opening the server span of each request.
+
+    The span ends when the response is sent; BackgroundTasks run after that
+    and show up as its children. The trace id is returned in X-Trace-Id.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        remote = None
+        for name, value in scope.get("headers", ()):
+            if name == b"traceparent":
+                try:
+                    remote = _parse_traceparent(value.decode("latin-1"))
+                except ValueError:
+                    remote = None
+                break
+
+        with span(
+            f"{scope['method']} {scope['path']}", KIND_SERVER, parent=remote,
+            **{"http.request.method": scope["method"], "url.path": scope["path"]},
+        ) as server_span:
+            if server_span is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    server_span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        server_span.status_code = STATUS_ERROR
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-trace-id", server_span.trace_id.encode()),
+                    ]
+                await send(message)
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    server_span.name = endpoint_name(scope)
+                    server_span.end()
+
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                # Requests that never finished a response end with the block
+                server_span.name = endpoint_name(scope)
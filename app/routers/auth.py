@@ -7,6 +7,7 @@ from tortoise.exceptions import IntegrityError
 
 from app.models.user import User
 from app.schemas import UserCreate, UserResponse
+from app.services.email_filter import remember_email
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -34,6 +35,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             is_verified=True,  # Since they authenticated through Supabase
             password_hash="supabase_auth"  # Placeholder since auth is handled by Supabase
         )
+        remember_email(user.email)
 
     return user
 
@@ -80,6 +82,7 @@ async def get_current_user_authenticated(credentials: HTTPAuthorizationCredentia
                 is_verified=True,  # Since they authenticated through Supabase
                 password_hash="supabase_auth"  # Placeholder since auth is handled by Supabase
             )
+            remember_email(user.email)
         except Exception as e:
             print(f"Error creating local user: {e}")
             raise credentials_exception
@@ -116,6 +119,7 @@ async def register(user_data: UserCreate):
         )
         user.set_password(user_data.password)
         await user.save()
+        remember_email(user.email)
         
         return UserResponse.from_orm(user)
     
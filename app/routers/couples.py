@@ -1,14 +1,45 @@
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends
+
+from app.routers.auth import get_current_user
+from app.models.user import User
+from app.schemas import CoupleCreate, CoupleUpdate, CoupleResponse
+from app.services.couple_service import (
+    create_couple,
+    get_couple_by_id,
+    update_couple,
+    ensure_couple_exists,
+    ensure_user_in_couple,
+)
 
 router = APIRouter(prefix="/couples", tags=["couples"])
 
-@router.post("")
-async def create_couple():
-    # TODO: Implement couple creation logic
-    return JSONResponse({"id": 1, "members": ["user1@example.com", "user2@example.com"]})
+@router.post("", response_model=CoupleResponse)
+async def create_couple_endpoint(
+    couple_data: CoupleCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Create a couple from two users and the couple session they share."""
+    couple = await create_couple(couple_data, current_user)
+    return CoupleResponse.from_orm(couple)
+
+@router.get("/{couple_id}", response_model=CoupleResponse)
+async def get_couple(
+    couple_id: int,
+    current_user: User = Depends(get_current_user)
+):
+    """Get a couple the current user belongs to."""
+    couple = ensure_couple_exists(await get_couple_by_id(couple_id))
+    ensure_user_in_couple(current_user, couple)
+    return CoupleResponse.from_orm(couple)
 
-@router.get("/{couple_id}")
-async def get_couple(couple_id: int):
-    # TODO: Implement couple info retrieval logic
-    return JSONResponse({"id": couple_id, "members": ["user1@example.com", "user2@example.com"]}) 
\ No newline at end of file
+@router.put("/{couple_id}", response_model=CoupleResponse)
+async def update_couple_endpoint(
+    couple_id: int,
+    couple_update: CoupleUpdate,
+    current_user: User = Depends(get_current_user)
+):
+    """Update a couple's details."""
+    couple = ensure_couple_exists(await get_couple_by_id(couple_id, primary=True))
+    ensure_user_in_couple(current_user, couple)
+    couple = await update_couple(couple, couple_update)
+    return CoupleResponse.from_orm(couple)
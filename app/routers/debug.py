@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from typing import Any, Dict, List, Optional
+import os
+
+from app.monitoring.loop_watchdog import LOOP_WATCHDOG_ENABLED, loop_watchdog
+from app.monitoring.query_counter import get_endpoint_query_stats
+from app.monitoring.tracing import get_recent_spans
+from app.schemas import DebugMetrics
+
+# Process internals for staging and local debugging. The router is only
+# mounted when DEBUG_ENDPOINTS_ENABLED (default: ENVIRONMENT=development).
+DEBUG_ENDPOINTS_ENABLED = os.getenv(
+    "DEBUG_ENDPOINTS_ENABLED", str(os.getenv("ENVIRONMENT") == "development")
+).lower() == "true"
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+# Metrics of this worker process
+@router.get("/metrics", response_model=DebugMetrics)
+async def get_metrics():
+    return DebugMetrics(
+        event_loop=loop_watchdog.snapshot() if LOOP_WATCHDOG_ENABLED else None,
+        queries=get_endpoint_query_stats(),
+    )
+
+# Recent spans from the in-memory exporter (TRACING_EXPORTER=memory), as OTLP/JSON
+@router.get("/traces")
+async def get_traces(trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    return get_recent_spans(trace_id)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import uuid
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from tortoise.expressions import Q
+
+from app.routers.auth import get_current_user
+from app.models.couple import Couple
+from app.models.user import User
+from app.schemas import MemoryImportStatus
+from app.services.import_service import (
+    IMPORT_DIR,
+    IMPORT_MAX_UPLOAD_BYTES,
+    get_import_job,
+    start_import_job,
+)
+
+router = APIRouter(prefix="/memories", tags=["memories"])
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _save_upload(file: UploadFile, path: str):
+    """Copy an upload to `path` off the event loop, up to IMPORT_MAX_UPLOAD_BYTES."""
+    out = await asyncio.to_thread(open, path, "wb")
+    written = 0
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            written += len(chunk)
+            if written > IMPORT_MAX_UPLOAD_BYTES:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail=f"Import files are limited to {IMPORT_MAX_UPLOAD_BYTES} bytes"
+                )
+            await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(out.close)
+        await asyncio.to_thread(os.remove, path)
+        raise
+    await asyncio.to_thread(out.close)
+
+
+# Import a transcript file (NDJSON, optionally gzipped) into the memory spaces.
+# Only the current user's own lines are imported, into their individual space
+# or as their side of one of their couples; use import_memories.py for
+# onboarding imports on behalf of other users.
+@router.post("/import", response_model=MemoryImportStatus, status_code=status.HTTP_202_ACCEPTED)
+async def import_memories(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+):
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    suffix = ".ndjson.gz" if (file.filename or "").endswith(".gz") else ".ndjson"
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}{suffix}")
+    await _save_upload(file, path)
+
+    # The current user's side ("A" for user1, "B" for user2) of each couple
+    couples = await Couple.filter(
+        Q(user1_id=current_user.id) | Q(user2_id=current_user.id)
+    ).values_list("id", "user1_id")
+    own_partner = {couple_id: "A" if user1_id == current_user.id else "B" for couple_id, user1_id in couples}
+
+    def allowed(record: dict) -> bool:
+        if record.get("user_id", current_user.id) != current_user.id:
+            return False
+        if record.get("couple_id") is None:
+            return record.get("user_id") == current_user.id
+        partner = own_partner.get(record["couple_id"])
+        return partner is not None and record.get("partner", partner) == partner
+
+    return start_import_job(path, allowed=allowed, owner_id=current_user.id)
+
+
+# Progress of an import the current user started on this worker.
+@router.get("/import/{job_id}", response_model=MemoryImportStatus)
+async def get_import_status(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+):
+    job = get_import_job(job_id, owner_id=current_user.id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return job
@@ -1,51 +1,41 @@
 import string
 import os
 from dotenv import load_dotenv
-from datetime import datetime
 
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import List, Dict, Any, Optional
+from datetime import datetime
 from pydantic import BaseModel
-from mem0 import MemoryClient
-from anthropic import Anthropic
+
+from app.models.user import User
+from app.monitoring.tracing import KIND_CLIENT, span, traced
+from app.routers.auth import get_current_user
+from app.schemas import MessageExportFilter, MessageReceipt, MessageResponse, MessageResponseList
+from app.services.export_service import ensure_export_allowed, iter_ndjson
+from app.services.message_service import get_session_messages, save_exchange, ensure_user_in_session
+from app.services.receipt_service import record_receipt
+from app.services.session_service import get_active_session_for_user, get_active_session_for_user_id
+from app.services.couple_service import get_couple_context
+from app.services.llm_service import call_llm
+from app.services.log_utils import log_message
+from app.services.memory_service import (
+    client,
+    format_memory_entry,
+    get_individual_agent,
+    invalidate_memory_snapshot,
+    search_memories,
+)
+from app.services.summary_service import get_session_summary, update_session_summary
 
 # Load environment variables
 load_dotenv()
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
-client = MemoryClient(api_key=os.getenv("MEM0_API_KEY"))
-anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-
-
-
-def log_message(level: str, message: str):
-    """Helper function to log messages with timestamp"""
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    print(f"[{timestamp}] [{level}] {message}")
-
-
-def get_couple_ai_agent(couple_id: int) -> str:
-    return f"couple_{couple_id}"
-
-
-def get_partner_agent(couple_id: int, partner: str) -> str:
-    """Get agent ID for a specific partner within a couple"""
-    return f"couple_{couple_id}_{partner}"
-
-
-def get_couple_agent(couple_id: int) -> str:
-    """Get the main couple agent for shared memories"""
-    return f"couple_{couple_id}_shared"
 
 
-def get_individual_agent(user_id: int) -> str:
-    """Get agent ID for individual therapy"""
-    return f"individual_{user_id}"
-
-
-def construct_prompt(message: str, memories: List[Dict[str, Any]], partner: Optional[str] = None, couple_names: Optional[Dict[str, str]] = None, is_individual: bool = False):
+def construct_prompt(message: str, memories: List[Dict[str, Any]], partner: Optional[str] = None, couple_names: Optional[Dict[str, str]] = None, is_individual: bool = False, session_summary: Optional[str] = None):
 
     if is_individual:
         # Individual therapy prompt
@@ -113,8 +103,14 @@ Never include meta-instructions or label your response structure. Speak like a g
 
     rag_context = "\n".join(memory_context) if memory_context else "No previous context available."
 
+    # Rolling summary of the current session, size-capped by summary_service
+    summary_context = session_summary or "This session has just started."
+
     full_prompt = f"""System: {system_prompt}
 
+This Session So Far:
+{summary_context}
+
 Context from Past Conversations:
 {rag_context}
 
@@ -129,76 +125,40 @@ Therapist's Response:
     return full_prompt
 
 
-def call_llm(full_prompt):
-    try:
-        log_message("LLM", "Sending request to Claude 3 Haiku...")
-        response = anthropic_client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": full_prompt
-                }
-            ]
-        )
-        
-        log_message("LLM", "Received response from Claude 3 Haiku")
-        
-        # Extract text content from the response
-        if response.content and len(response.content) > 0:
-            content_block = response.content[0]
-            if hasattr(content_block, 'text'):
-                log_message("LLM", "✅ Successfully extracted text from response")
-                return content_block.text
-            else:
-                log_message("LLM", f"⚠️ Unexpected content block type: {type(content_block)}")
-                return str(content_block)
-        else:
-            log_message("LLM", "❌ Empty response received")
-            return "I apologize, but I received an empty response. Please try again."
-            
-    except Exception as e:
-        log_message("ERROR", f"Error calling Claude 3 Haiku: {e}")
-        return "I apologize, but I'm having trouble processing your request right now. Please try again later."
-
-
 class SendMessageRequest(BaseModel):
     message: str
     sender_id: Optional[str] = None  # Optional: to track who sent the message
-    partner: Optional[str] = None  # "A" or "B" to identify which partner is speaking
-    couple_names: Optional[Dict[str, str]] = None  # {"A": "Alex", "B": "Mary"} or similar
+    partner: Optional[str] = None  # Deprecated: derived from user_id via the couple context
+    couple_names: Optional[Dict[str, str]] = None  # Deprecated: ignored, names come from the couple context
     couple_id: Optional[int] = None  # None for individual therapy, ID for couples therapy
-    user_id: Optional[int] = None  # For individual therapy
+    user_id: Optional[int] = None  # Sender; required for individual therapy
+    session_id: Optional[int] = None  # Must be the sender's active session; defaults to it
 
 
+@traced("background.store_conversation")
 async def store_conversation_async(agent_id: str, secondary_agent_id: Optional[str], user_message: str, ai_response: str, partner: Optional[str] = None, couple_names: Optional[Dict[str, str]] = None, is_individual: bool = False):
     """Async function to store conversation in memory using agents"""
     try:
         # Create enhanced message content
-        if is_individual:
-            enhanced_message = f"User: {user_message}"
-        else:
-            # Couples therapy - add partner name and context
-            if couple_names and partner:
-                partner_name = couple_names.get(partner, f"Partner {partner}")
-                enhanced_message = f"{partner_name}: {user_message}"
-            else:
-                partner_prefix = f"Partner {partner}: " if partner else ""
-                enhanced_message = f"{partner_prefix}{user_message}"
+        enhanced_message = format_memory_entry(user_message, partner, couple_names, is_individual)
         
         # Store user message in main memory space
         log_message("ASYNC", f"Storing user message in main memory: {agent_id}")
-        client.add([
-            {"role": "user", "content": enhanced_message}
-        ], agent_id=agent_id)
+        with span("mem0.add", KIND_CLIENT, **{"memory.agent_id": agent_id}):
+            client.add([
+                {"role": "user", "content": enhanced_message}
+            ], agent_id=agent_id)
         
         # Also store in secondary memory space if available (partner's individual memory for couples)
         if secondary_agent_id:
             log_message("ASYNC", f"Storing user message in secondary memory: {secondary_agent_id}")
-            client.add([
-                {"role": "user", "content": enhanced_message}
-            ], agent_id=secondary_agent_id)
+            with span("mem0.add", KIND_CLIENT, **{"memory.agent_id": secondary_agent_id}):
+                client.add([
+                    {"role": "user", "content": enhanced_message}
+                ], agent_id=secondary_agent_id)
+
+        # Prefetched snapshots of these spaces are now out of date
+        invalidate_memory_snapshot(agent_id, *([secondary_agent_id] if secondary_agent_id else []))
         
         therapy_type = "individual" if is_individual else "couples"
         log_message("ASYNC", f"✅ User message stored successfully for {therapy_type} therapy (Speaker: {partner if partner else 'User'})")
@@ -207,6 +167,26 @@ async def store_conversation_async(agent_id: str, secondary_agent_id: Optional[s
 
 
 
+@traced("background.store_messages")
+async def store_messages_async(session_id: Optional[int], user_id: Optional[int], user_message: str, ai_response: str):
+    """Async function to persist the exchange in the messages table"""
+    if session_id is None or user_id is None:
+        log_message("ASYNC", "No session or sender for this exchange, skipping message persistence")
+        return
+    try:
+        await save_exchange(session_id, user_id, user_message, ai_response)
+        log_message("ASYNC", f"✅ Exchange stored in session {session_id}")
+    except Exception as e:
+        log_message("ERROR", f"Failed to store messages asynchronously: {e}")
+        return
+
+    try:
+        # Refresh the rolling summary every SESSION_SUMMARY_EVERY_TURNS turns
+        await update_session_summary(session_id)
+    except Exception as e:
+        log_message("ERROR", f"Failed to update summary of session {session_id}: {e}")
+
+
 # Individual Therapy:
 # {
 #   "message": "I'm feeling anxious about work",
@@ -215,12 +195,11 @@ async def store_conversation_async(agent_id: str, secondary_agent_id: Optional[s
 # }
 
 
-# Couples Therapy:
+# Couples Therapy (names and partner are resolved server-side from the couple):
 # {
 #   "message": "We've been arguing a lot lately",
 #   "couple_id": 456,
-#   "partner": "A",
-#   "couple_names": {"A": "Alice", "B": "Bob"}
+#   "user_id": 123
 # }
 @router.post("")
 async def send_message(request: SendMessageRequest, background_tasks: BackgroundTasks):
@@ -240,6 +219,9 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
             return JSONResponse({"error": "user_id is required for individual therapy"}, status_code=400)
         
         log_message("INFO", f"User ID: {request.user_id}")
+        partner = None
+        couple_names = None
+        sender_user_id = request.user_id
         
         # Get agent ID for individual therapy
         main_agent = get_individual_agent(request.user_id)
@@ -249,7 +231,7 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
         
         # Search for relevant memories from individual agent
         log_message("INFO", "Searching for relevant memories...")
-        all_memories = client.search(request.message, agent_id=main_agent)
+        all_memories = await search_memories(request.message, main_agent)
         log_message("INFO", f"✅ Found {len(all_memories)} memories in individual space")
         
     else:
@@ -257,13 +239,25 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
         if not request.couple_id:
             return JSONResponse({"error": "couple_id is required for couples therapy"}, status_code=400)
         
+        # Names, partner mapping and agent ids come from the cached couple context
+        couple_context = await get_couple_context(request.couple_id)
+        if not couple_context:
+            return JSONResponse({"error": "Couple not found"}, status_code=404)
+        if request.user_id is not None and request.user_id not in couple_context.partners:
+            return JSONResponse({"error": "user_id is not a member of this couple"}, status_code=403)
+        partner = request.partner or couple_context.partners.get(request.user_id)
+        couple_names = couple_context.names
+        sender_user_id = request.user_id or next(
+            (uid for uid, letter in couple_context.partners.items() if letter == partner), None
+        )
+        
         log_message("INFO", f"Couple ID: {request.couple_id}")
-        log_message("INFO", f"Partner: {request.partner}")
-        log_message("INFO", f"Couple Names: {request.couple_names}")
+        log_message("INFO", f"Partner: {partner}")
+        log_message("INFO", f"Couple Names: {couple_names}")
         
         # Get agent IDs for couples therapy
-        main_agent = get_couple_agent(request.couple_id)
-        secondary_agent = get_partner_agent(request.couple_id, request.partner) if request.partner else None
+        main_agent = couple_context.agents["shared"]
+        secondary_agent = couple_context.agents.get(partner) if partner else None
         
         log_message("INFO", f"Couple Agent: {main_agent}")
         log_message("INFO", f"Partner Agent: {secondary_agent}")
@@ -272,19 +266,27 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
         log_message("INFO", "Searching for relevant memories...")
         
         # Search in couple's shared memories
-        couple_memories = client.search(request.message, agent_id=main_agent)
+        couple_memories = await search_memories(request.message, main_agent)
         log_message("INFO", f"✅ Found {len(couple_memories)} memories in couple's shared space")
         
         # Search in partner's individual memories
         partner_memories = []
         if secondary_agent:
-            partner_memories = client.search(request.message, agent_id=secondary_agent)
+            partner_memories = await search_memories(request.message, secondary_agent)
             log_message("INFO", f"✅ Found {len(partner_memories)} memories in partner's individual space")
         
         # Combine memories (couple memories first, then partner memories)
         all_memories = couple_memories + partner_memories
         log_message("INFO", f"✅ Total memories found: {len(all_memories)}")
     
+    # The exchange is only stored in the session the sender is active in
+    active_session = await get_active_session_for_user_id(sender_user_id) if sender_user_id else None
+    if request.session_id is not None and (active_session is None or active_session.id != request.session_id):
+        return JSONResponse({"error": "Sender is not an active participant of this session"}, status_code=403)
+    session_id = active_session.id if active_session else None
+
+    session_summary = await get_session_summary(session_id) if session_id else None
+
     # Log memory details if any found
     if all_memories:
         for i, memory in enumerate(all_memories[:3]):  # Show first 3 memories
@@ -296,9 +298,10 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
     prompt_data = construct_prompt(
         request.message, 
         all_memories, 
-        request.partner, 
-        request.couple_names, 
-        is_individual
+        partner, 
+        couple_names, 
+        is_individual,
+        session_summary
     )
     log_message("INFO", f"✅ Prompt constructed ({len(prompt_data)} characters)")
 
@@ -315,10 +318,17 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
         secondary_agent,
         request.message, 
         ai_response, 
-        request.partner,
-        request.couple_names,
+        partner,
+        couple_names,
         is_individual
     )
+    background_tasks.add_task(
+        store_messages_async,
+        session_id,
+        sender_user_id,
+        request.message,
+        ai_response,
+    )
     
     log_message("INFO", f"=== {therapy_type.upper()} THERAPY REQUEST COMPLETED (storage in background) ===\n")
 
@@ -339,19 +349,70 @@ async def send_message(request: SendMessageRequest, background_tasks: Background
         response_data.update({
             "couple_id": request.couple_id,
             "secondary_agent": secondary_agent,
-            "partner": request.partner,
-            "couple_names": request.couple_names,
+            "partner": partner,
+            "couple_names": couple_names,
             "couple_memories": len(couple_memories) if 'couple_memories' in locals() else 0,
             "partner_memories": len(partner_memories) if 'partner_memories' in locals() else 0
         })
 
-    return JSONResponse(response_data)
+    return response_data
+
+
+@router.get("", response_model=List[MessageResponse])
+async def get_messages(
+    session_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    before_id: Optional[int] = Query(None, description="Load messages older than this id"),
+    current_user: User = Depends(get_current_user),
+):
+    """Get a session's message history, oldest first."""
+    await ensure_user_in_session(current_user, session_id)
+    messages = await get_session_messages(session_id, limit, before_id)
+    return MessageResponseList.validate_python(messages, from_attributes=True)
+
+
+@router.get("/export")
+async def export_messages(
+    session_id: Optional[int] = None,
+    couple_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = Query(None, description="Only messages created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Only messages created before this time"),
+    gzip: bool = Query(False, description="gzip-compress the NDJSON stream"),
+    current_user: User = Depends(get_current_user),
+):
+    """Stream messages as NDJSON (one JSON object per line), oldest first."""
+    export_filter = MessageExportFilter(
+        session_id=session_id, couple_id=couple_id, user_id=user_id, since=since, until=until
+    )
+    await ensure_export_allowed(current_user, export_filter)
+
+    filename = "messages.ndjson.gz" if gzip else "messages.ndjson"
+    return StreamingResponse(
+        iter_ndjson(export_filter, compress=gzip),
+        media_type="application/gzip" if gzip else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
-@router.get("")
-async def get_messages(couple_id: int = None, user_id: int = None):
-    # TODO: Implement message retrieval logic for both individual and couples therapy
-    return JSONResponse([
-        {"id": 1, "sender": "user1@example.com", "text": "Hello!", "timestamp": "2024-01-01T00:00:00Z"},
-        {"id": 2, "sender": "user2@example.com", "text": "Hi!", "timestamp": "2024-01-01T00:01:00Z"}
-    ])
\ No newline at end of file
+@router.post("/receipts", status_code=status.HTTP_202_ACCEPTED)
+async def post_receipts(
+    receipt: MessageReceipt,
+    current_user: User = Depends(get_current_user),
+):
+    """Mark messages as delivered/read. Receipts are coalesced and applied shortly after."""
+    if receipt.up_to_id is None and not receipt.message_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Give up_to_id or message_ids"
+        )
+    # Receipts come from the session the user is in; the cached lookup avoids
+    # a membership query per receipt
+    active_session = await get_active_session_for_user(current_user)
+    if not active_session or active_session.id != receipt.session_id:
+        await ensure_user_in_session(current_user, receipt.session_id)
+
+    await record_receipt(
+        receipt.session_id, current_user.id, receipt.status, receipt.up_to_id, receipt.message_ids
+    )
+    return {"message": "Receipt accepted"}
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
 from typing import Union
 
 from app.routers.auth import get_current_user
@@ -8,64 +8,91 @@ from app.schemas import (
     SessionCreateCouple,
     SessionJoin,
     SessionResponse,
+    SessionBatchLookup,
+    SessionBatchResponse,
     SessionWithParticipants,
 )
+from app.services.etag import etag_matches, not_modified, set_etag
+from app.services.prefetch_service import SESSION_PREFETCH_ENABLED, prefetch_session_context
 from app.services.session_service import (
     get_active_session_for_user,
-    check_user_active_session,
+    session_etag,
     create_new_session,
-    get_session_by_code,
-    add_participant_to_session,
+    get_sessions_by_codes,
+    join_session_by_code,
+    remove_participant_from_session,
     ensure_session_exists,
-    ensure_session_has_capacity,
-    ensure_user_not_in_session,
 )
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
-# Return the active session (if any) that the current user is part of.
+# Return the active session (if any) that the current user is part of, or 304
+# when the client's If-None-Match is still current.
+# The caches the first message will need are warmed in the background.
 @router.get("/get-session", response_model=SessionWithParticipants)
 async def get_session(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
 
     session = await get_active_session_for_user(current_user)
     if not session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    if SESSION_PREFETCH_ENABLED:
+        background_tasks.add_task(prefetch_session_context, session, current_user.id)
+    etag = session_etag(session)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
     return session
 
-# Check if user already has a session
 # Create new session
+# The "user already has a session" check runs inside the same statement
 @router.post("/create-session", response_model=SessionWithParticipants)
 async def create_session(
     session_data: Union[SessionCreateSolo, SessionCreateCouple],
     current_user: User = Depends(get_current_user),
 ):
 
-    existing = await check_user_active_session(current_user)
-    ensure_user_not_in_session(existing)
-    
     session = await create_new_session(session_data, current_user)
     return session  # Now returns SessionWithParticipants
 
 
-# Check if user already has a session
 # Join an existing session using its 8-character code.
-# Add user to session
+# Seat claim, capacity and "already in a session" checks are a single statement
 @router.post("/join-session", response_model=SessionResponse)
 async def join_session(
     join_data: SessionJoin,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
 ):
-        
-    existing = await check_user_active_session(current_user)
-    ensure_user_not_in_session(existing)
-    
 
-    session = await get_session_by_code(join_data.session_code)
-    session = ensure_session_exists(session) 
-    ensure_session_has_capacity(session)     
-    
+    session = await join_session_by_code(join_data.session_code, current_user)
+    if SESSION_PREFETCH_ENABLED:
+        background_tasks.add_task(prefetch_session_context, session, current_user.id)
+    return session
+
+
+# Leave the current user's active session, freeing their seat.
+@router.post("/leave-session", response_model=SessionResponse)
+async def leave_session(
+    current_user: User = Depends(get_current_user),
+):
+
+    session = await remove_participant_from_session(current_user)
+    return ensure_session_exists(session)
+
+
+# Resolve many sessions by code in one round-trip.
+@router.post("/batch", response_model=SessionBatchResponse)
+async def get_sessions_batch(
+    lookup: SessionBatchLookup,
+    current_user: User = Depends(get_current_user),
+):
 
-    session = await add_participant_to_session(session, current_user)  
-    return SessionResponse.from_orm(session)
\ No newline at end of file
+    sessions = await get_sessions_by_codes(lookup.session_codes)
+    return SessionBatchResponse(
+        by_code={code: SessionResponse.from_orm(s) if s else None for code, s in sessions.items()}
+    )
@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response
 from typing import List, Optional
 
 from app.models.user import User
-from app.schemas import UserResponse, UserUpdate
+from app.schemas import (
+    UserResponse,
+    UserUpdate,
+    UserPage,
+    UserBatchLookup,
+    UserBatchResponse,
+    UserResponseList,
+)
 from app.routers.auth import get_current_user
+from app.services.etag import etag_matches, not_modified, set_etag
 from app.services.user_service import (
     get_paginated_users,
     get_user_by_id,
     get_user_by_email,
     get_user_by_username,
+    get_users_batch,
     check_email_exists,
     update_user_profile,
     deactivate_user,
@@ -17,6 +26,7 @@ from app.services.user_service import (
     ensure_user_exists,
     ensure_user_is_active,
     ensure_user_can_modify,
+    user_etag,
 )
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -29,23 +39,33 @@ async def check_email_exists_endpoint(email: str = Query(..., description="Email
     return {"exists": exists}
 
 # Protected endpoints 
-@router.get("/", response_model=List[UserResponse])
+@router.get("/", response_model=UserPage)
 async def get_users_endpoint(
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
     limit: int = Query(10, ge=1, le=100),
     current_user: User = Depends(get_current_user)
 ):
-    """Get all users with pagination."""
-    users = await get_paginated_users(skip, limit)
-    return [UserResponse.from_orm(user) for user in users]
+    """Get all users with cursor pagination."""
+    users, next_cursor = await get_paginated_users(cursor, limit)
+    return UserPage(
+        items=UserResponseList.validate_python(users, from_attributes=True),
+        next_cursor=next_cursor,
+    )
 
 @router.get("/user-details", response_model=UserResponse)
 async def get_user_details(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user)
 ):
-    """Get current user's details."""
-    user = await get_user_by_id(current_user.id)
-    return UserResponse.from_orm(ensure_user_exists(user))
+    """Get current user's details (304 when If-None-Match is current)."""
+    # Auth already loaded the row from the primary, so a profile update is
+    # visible here immediately without waiting on the replica
+    etag = user_etag(current_user)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return UserResponse.from_orm(current_user)
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user_endpoint(
@@ -56,7 +76,7 @@ async def update_user_endpoint(
     """Update a user's information."""
     ensure_user_can_modify(current_user, user_id)
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_by_id(user_id, primary=True)
     user = ensure_user_exists(user)
     user = ensure_user_is_active(user)
     
@@ -71,7 +91,7 @@ async def delete_user_endpoint(
     """Delete a user account (soft delete)."""
     ensure_user_can_modify(current_user, user_id)
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_by_id(user_id, primary=True)
     user = ensure_user_exists(user)
     
     await deactivate_user(user)
@@ -95,6 +115,18 @@ async def get_user_by_email_endpoint(
     user = await get_user_by_email(email)
     return UserResponse.from_orm(ensure_user_exists(user))
 
+@router.post("/batch", response_model=UserBatchResponse)
+async def get_users_batch_endpoint(
+    lookup: UserBatchLookup,
+    current_user: User = Depends(get_current_user)
+):
+    """Find many users by id and/or email in one request."""
+    by_id, by_email = await get_users_batch(lookup.ids, lookup.emails)
+    return UserBatchResponse(
+        by_id={k: UserResponse.from_orm(u) if u else None for k, u in by_id.items()},
+        by_email={k: UserResponse.from_orm(u) if u else None for k, u in by_email.items()},
+    )
+
 @router.post("/{user_id}/partner/{partner_id}")
 async def link_partner_endpoint(
     user_id: int,
@@ -104,11 +136,11 @@ async def link_partner_endpoint(
     """Link two users as partners."""
     ensure_user_can_modify(current_user, user_id)
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_by_id(user_id, primary=True)
     user = ensure_user_exists(user)
     user = ensure_user_is_active(user)
     
-    partner = await get_user_by_id(partner_id)
+    partner = await get_user_by_id(partner_id, primary=True)
     partner = ensure_user_exists(partner)
     partner = ensure_user_is_active(partner)
     
@@ -123,7 +155,7 @@ async def unlink_partner_endpoint(
     """Unlink user from their partner."""
     ensure_user_can_modify(current_user, user_id)
     
-    user = await get_user_by_id(user_id)
+    user = await get_user_by_id(user_id, primary=True)
     user = ensure_user_exists(user)
     
     await unlink_partners(user)
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, field_validator
 from typing import Optional, Literal
-from datetime import datetime, date
+from datetime import datetime, date, timezone
 
 # User schemas
 class UserBase(BaseModel):
@@ -27,6 +27,9 @@ class UserUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 class UserResponse(UserBase):
+    # Emails are validated on the way in; re-running EmailStr validation on
+    # every serialized row dominated the cost of list responses
+    email: str
     id: int
     is_active: bool
     is_verified: bool
@@ -38,6 +41,24 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    """A page of users plus the opaque cursor of the next page (None on the last page)."""
+    items: list[UserResponse]
+    next_cursor: Optional[str] = None
+
+# Maximum number of keys accepted by the batch lookup endpoints
+BATCH_LOOKUP_LIMIT = 100
+
+class UserBatchLookup(BaseModel):
+    """Resolve many users at once by id and/or email."""
+    ids: list[int] = Field(default_factory=list, max_length=BATCH_LOOKUP_LIMIT)
+    emails: list[str] = Field(default_factory=list, max_length=BATCH_LOOKUP_LIMIT)
+
+class UserBatchResponse(BaseModel):
+    """Users keyed by the requested id / email; None where no user matched."""
+    by_id: dict[int, Optional[UserResponse]] = {}
+    by_email: dict[str, Optional[UserResponse]] = {}
+
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
@@ -53,11 +74,16 @@ class TokenData(BaseModel):
 class CoupleBase(BaseModel):
     user1_id: int
     user2_id: int
+    session_id: int  # Couple session the pair was formed in
     relationship_start_date: Optional[date] = None
 
 class CoupleCreate(CoupleBase):
     pass
 
+class CoupleUpdate(BaseModel):
+    relationship_start_date: Optional[date] = None
+    is_active: Optional[bool] = None
+
 class CoupleResponse(CoupleBase):
     id: int
     created_at: datetime
@@ -67,6 +93,14 @@ class CoupleResponse(CoupleBase):
     class Config:
         from_attributes = True
 
+class CoupleContext(BaseModel):
+    """Everything a chat turn needs to know about a couple, served from cache."""
+    couple_id: int
+    session_id: int
+    names: dict[str, str]  # {"A": "Alex", "B": "Mary"}
+    partners: dict[int, str]  # user_id -> "A" | "B"
+    agents: dict[str, str]  # "shared" | "A" | "B" -> memory agent id
+
 # Session schemas
 class SessionBase(BaseModel):
     session_mode: Literal["solo", "couple"] = Field(...)
@@ -103,6 +137,14 @@ class SessionResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SessionBatchLookup(BaseModel):
+    """Resolve many sessions at once by session code."""
+    session_codes: list[str] = Field(..., min_length=1, max_length=BATCH_LOOKUP_LIMIT)
+
+class SessionBatchResponse(BaseModel):
+    """Sessions keyed by the requested code; None where no session matched."""
+    by_code: dict[str, Optional[SessionResponse]]
+
 class SessionParticipantResponse(BaseModel):
     id: int
     session_id: int
@@ -141,6 +183,33 @@ class MessageResponse(MessageBase):
     class Config:
         from_attributes = True
 
+class MessageReceipt(BaseModel):
+    """Mark messages of a session as delivered/read by the current user.
+
+    Give a high-water mark (every message up to and including `up_to_id`)
+    and/or explicit `message_ids`.
+    """
+    session_id: int
+    status: Literal["delivered", "read"]
+    up_to_id: Optional[int] = None
+    message_ids: list[int] = Field(default_factory=list, max_length=500)
+
+class MessageExportFilter(BaseModel):
+    """Which messages to export; unset fields don't filter."""
+    session_id: Optional[int] = None
+    couple_id: Optional[int] = None
+    user_id: Optional[int] = None
+    since: Optional[datetime] = None  # Inclusive
+    until: Optional[datetime] = None  # Exclusive
+
+    @field_validator("since", "until")
+    @classmethod
+    def assume_utc(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Timestamps are stored in UTC; a bare 2026-01-01 means midnight UTC
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
 # For chat conversation retrieval
 class ChatConversationResponse(BaseModel):
     session_id: int
@@ -150,3 +219,50 @@ class ChatConversationResponse(BaseModel):
     
     class Config:
         from_attributes = True
+
+# Memory import schemas
+class MemoryImportStatus(BaseModel):
+    """Progress of a bulk transcript import into the memory spaces."""
+    job_id: str
+    status: Literal["running", "completed", "failed"] = "running"
+    lines_read: int = 0
+    memories_imported: int = 0
+    skipped: int = 0
+    memories_per_second: float = 0.0
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+# Debug metrics schemas
+class BlockedLoopStack(BaseModel):
+    """Where the event loop was stuck when the watchdog caught it blocked."""
+    at: datetime
+    duration_ms: Optional[float] = None  # Set once the loop comes back
+    stack: list[str]
+
+class EventLoopMetrics(BaseModel):
+    samples: int
+    lag_p50_ms: float
+    lag_p90_ms: float
+    lag_p99_ms: float
+    lag_max_ms: float
+    blocked_count: int
+    blocked_seconds: float
+    recent_blocks: list[BlockedLoopStack]
+
+class EndpointQueryStats(BaseModel):
+    """DB statements run by the requests of one endpoint."""
+    requests: int = 0
+    queries: int = 0
+    queries_max: int = 0  # Most queries in a single request
+    db_time_ms: float = 0.0
+
+class DebugMetrics(BaseModel):
+    event_loop: Optional[EventLoopMetrics] = None  # None when the watchdog is off
+    queries: dict[str, EndpointQueryStats] = Field(default_factory=dict)  # By endpoint
+
+# Batch validators. Validating a whole list in one call stays inside
+# pydantic-core instead of building every item from Python one at a time.
+# Use with `from_attributes=True` when validating ORM objects.
+UserResponseList = TypeAdapter(list[UserResponse])
+MessageResponseList = TypeAdapter(list[MessageResponse])
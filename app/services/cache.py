@@ -0,0 +1,60 @@
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+MISSING = object()
+
+
+class TTLCache:
+    """Small in-process cache with per-entry expiry.
+
+    Entries are only valid inside a single worker process, so callers must
+    invalidate explicitly on writes and keep the TTL short enough that other
+    workers converge quickly.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Return the cached value, or `default` (MISSING) if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._entries.pop(key, None)
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None):
+        """Store a value, evicting the oldest entry when the cache is full."""
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+    def invalidate(self, *keys: Hashable):
+        """Drop the given keys from the cache."""
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def keys_where(self, predicate: Callable[[Hashable, Any], bool]) -> List[Hashable]:
+        """Return the keys of live entries for which `predicate(key, value)` is true."""
+        now = time.monotonic()
+        return [
+            key for key, (expires_at, value) in self._entries.items()
+            if expires_at >= now and predicate(key, value)
+        ]
+
+    def invalidate_where(self, predicate: Callable[[Hashable, Any], bool]):
+        """Drop every entry for which `predicate(key, value)` is true."""
+        self.invalidate(*self.keys_where(predicate))
+
+    def clear(self):
+        self._entries.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not MISSING
+
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.database import get_read_db
+from app.services.couple_service import get_couple_context
+from app.services.llm_service import complete
+from app.services.log_utils import log_message
+from app.services.memory_service import (
+    MEMORY_SEARCH_TIMEOUT,
+    as_memory_list,
+    client,
+    get_individual_agent,
+    invalidate_memory_snapshot,
+)
+
+# Memory compaction keeps each agent space from growing without limit: exact
+# duplicates are deleted and raw memories older than MIN_AGE_DAYS are folded,
+# BATCH_SIZE at a time, into summary memories. Summaries are folded again once
+# a space holds more than MAX_SUMMARIES of them, so a space converges to
+# roughly MAX_SUMMARIES summaries plus its recent raw memories.
+MEMORY_COMPACTION_ENABLED = os.getenv("MEMORY_COMPACTION_ENABLED", "false").lower() == "true"
+MEMORY_COMPACTION_INTERVAL = float(os.getenv("MEMORY_COMPACTION_INTERVAL", "86400"))
+# Spaces with a stored message in this window are compacted on the next run
+MEMORY_COMPACTION_LOOKBACK = float(os.getenv("MEMORY_COMPACTION_LOOKBACK", "86400"))
+MEMORY_COMPACTION_MIN_AGE_DAYS = float(os.getenv("MEMORY_COMPACTION_MIN_AGE_DAYS", "7"))
+MEMORY_COMPACTION_BATCH_SIZE = int(os.getenv("MEMORY_COMPACTION_BATCH_SIZE", "50"))
+MEMORY_COMPACTION_MAX_SUMMARIES = int(os.getenv("MEMORY_COMPACTION_MAX_SUMMARIES", "20"))
+
+# mem0 calls from the job get more slack than the ones on the request path
+MEMORY_COMPACTION_TIMEOUT = MEMORY_SEARCH_TIMEOUT * 6
+
+ACTIVE_SPACES_SQL = """
+SELECT DISTINCT s."couple_id", s."session_mode", m."user_id"
+FROM "messages" m
+JOIN "sessions" s ON s."id" = m."session_id"
+WHERE m."created_at" >= $1 AND m."sender_type" = 'human'
+"""
+
+SUMMARY_PROMPT = """You maintain the long-term memory of a therapy assistant.
+Consolidate the memories below into a short list of facts, one per line, starting with "- ".
+Keep names, feelings, recurring patterns, important events and dates. Merge repeated or
+overlapping points and drop small talk. Do not add anything that is not in the memories.
+
+Memories (oldest first):
+{memories}
+
+Consolidated memories:
+"""
+
+
+async def _mem0(func, *args, **kwargs):
+    # The mem0 client is synchronous; keep it off the event loop
+    return await asyncio.wait_for(
+        asyncio.to_thread(func, *args, **kwargs), timeout=MEMORY_COMPACTION_TIMEOUT
+    )
+
+
+def _created_at(memory: Dict[str, Any]) -> datetime:
+    try:
+        created_at = datetime.fromisoformat(str(memory.get("created_at")).replace("Z", "+00:00"))
+    except ValueError:
+        return datetime.now(timezone.utc)
+    return created_at if created_at.tzinfo else created_at.replace(tzinfo=timezone.utc)
+
+
+def _level(memory: Dict[str, Any]) -> int:
+    """0 for raw memories, n for summaries folded n times."""
+    return int((memory.get("metadata") or {}).get("compaction_level", 0))
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+async def get_active_memory_spaces(since: datetime) -> List[str]:
+    """Agent ids of the memory spaces that received messages since `since`."""
+    rows = await get_read_db().execute_query_dict(ACTIVE_SPACES_SQL, [since])
+    agents = set()
+    for row in rows:
+        if row["couple_id"] is not None:
+            context = await get_couple_context(row["couple_id"])
+            if context:
+                agents.update(context.agents.values())
+        elif row["session_mode"] == "solo":
+            agents.add(get_individual_agent(row["user_id"]))
+    return sorted(agents)
+
+
+async def _delete_memories(memories: List[Dict[str, Any]]):
+    for memory in memories:
+        await _mem0(client.delete, memory["id"])
+
+
+async def _fold(agent_id: str, memories: List[Dict[str, Any]], level: int, dry_run: bool) -> bool:
+    """Replace `memories` (oldest first) with a single summary memory."""
+    if dry_run:
+        return True
+
+    text = "\n".join(f"- {memory['memory']}" for memory in memories)
+    summary = (await asyncio.to_thread(complete, SUMMARY_PROMPT.format(memories=text))).strip()
+    if not summary:
+        return False
+
+    # The summary is written before the originals are deleted: a run that dies
+    # half-way leaves duplicates for the next run, never a hole
+    await _mem0(
+        client.add,
+        [{"role": "user", "content": summary}],
+        agent_id=agent_id,
+        infer=False,
+        metadata={
+            "compaction_level": level,
+            "source_count": len(memories),
+            "period_start": _created_at(memories[0]).isoformat(),
+            "period_end": _created_at(memories[-1]).isoformat(),
+        },
+    )
+    await _delete_memories(memories)
+    return True
+
+
+async def compact_memory_space(agent_id: str, dry_run: bool = False) -> Dict[str, int]:
+    """Deduplicate and summarize the old memories of one agent space."""
+    stats = {"memories": 0, "duplicates_removed": 0, "memories_folded": 0, "summaries_added": 0}
+    memories = sorted(as_memory_list(await _mem0(client.get_all, agent_id=agent_id)), key=_created_at)
+    stats["memories"] = len(memories)
+
+    # Exact duplicates (ignoring case and whitespace): keep the newest copy
+    latest: Dict[str, Dict[str, Any]] = {}
+    for memory in memories:
+        latest[_normalize(memory.get("memory", ""))] = memory
+    kept_ids = {memory["id"] for memory in latest.values()}
+    duplicates = [memory for memory in memories if memory["id"] not in kept_ids]
+    if duplicates and not dry_run:
+        await _delete_memories(duplicates)
+    stats["duplicates_removed"] = len(duplicates)
+    memories = [memory for memory in memories if memory["id"] in kept_ids]
+
+    # Raw memories past the minimum age, in full batches only
+    cutoff = datetime.now(timezone.utc) - timedelta(days=MEMORY_COMPACTION_MIN_AGE_DAYS)
+    old_raw = [m for m in memories if _level(m) == 0 and _created_at(m) < cutoff]
+    summaries = [m for m in memories if _level(m) > 0]
+    for start in range(0, len(old_raw) - MEMORY_COMPACTION_BATCH_SIZE + 1, MEMORY_COMPACTION_BATCH_SIZE):
+        batch = old_raw[start:start + MEMORY_COMPACTION_BATCH_SIZE]
+        if await _fold(agent_id, batch, level=1, dry_run=dry_run):
+            stats["memories_folded"] += len(batch)
+            stats["summaries_added"] += 1
+
+    # Too many summaries: fold the oldest ones into one of the next level
+    excess = len(summaries) - MEMORY_COMPACTION_MAX_SUMMARIES
+    if excess > 0:
+        batch = summaries[:max(excess + 1, 2)]
+        if await _fold(agent_id, batch, level=max(map(_level, batch)) + 1, dry_run=dry_run):
+            stats["memories_folded"] += len(batch)
+            stats["summaries_added"] += 1
+
+    if not dry_run and (stats["duplicates_removed"] or stats["summaries_added"]):
+        invalidate_memory_snapshot(agent_id)
+    return stats
+
+
+async def compact_memories(agent_ids: Optional[List[str]] = None, dry_run: bool = False) -> Dict[str, Dict[str, int]]:
+    """Compact the given agent spaces, or every recently active one."""
+    if agent_ids is None:
+        since = datetime.now(timezone.utc) - timedelta(seconds=MEMORY_COMPACTION_LOOKBACK)
+        agent_ids = await get_active_memory_spaces(since)
+
+    results = {}
+    for agent_id in agent_ids:
+        try:
+            results[agent_id] = await compact_memory_space(agent_id, dry_run=dry_run)
+            log_message("COMPACT", f"{agent_id}: {results[agent_id]}")
+        except Exception as e:
+            # One broken space must not stop the others
+            log_message("ERROR", f"Memory compaction failed for {agent_id}: {e!r}")
+    return results
@@ -0,0 +1,153 @@
+from fastapi import HTTPException, status
+from typing import Optional
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+import os
+
+from app.database import get_read_db, get_write_db
+from app.models.couple import Couple
+from app.models.session import Session
+from app.models.session_participant import SessionParticipant
+from app.models.user import User
+from app.schemas import CoupleCreate, CoupleUpdate, CoupleContext
+from app.services.cache import TTLCache, MISSING
+from app.services.memory_service import get_couple_agent, get_partner_agent
+
+# Couple context (names, partner mapping, agent ids) keyed by couple_id, so
+# sending a message needs no DB lookup. Invalidated when the couple or one of
+# its members changes, but only in the worker making the change: other workers
+# may serve a renamed or deactivated couple's old context until the TTL runs out.
+COUPLE_CONTEXT_CACHE_TTL = float(os.getenv("COUPLE_CONTEXT_CACHE_TTL", "30"))
+_couple_context_cache = TTLCache(ttl_seconds=COUPLE_CONTEXT_CACHE_TTL)
+
+COUPLE_CONTEXT_SQL = """
+SELECT
+    c."id", c."session_id", c."user1_id", c."user2_id",
+    u1."first_name" AS "user1_first_name", u2."first_name" AS "user2_first_name"
+FROM "couples" c
+JOIN "users" u1 ON u1."id" = c."user1_id"
+JOIN "users" u2 ON u2."id" = c."user2_id"
+WHERE c."id" = $1 AND c."is_active"
+"""
+
+async def create_couple(couple_data: CoupleCreate, creator: User) -> Couple:
+    """Create a couple and attach it to the session it was formed in.
+
+    Both users must have joined that couple session, so nobody can pair
+    themselves with a user who wasn't there, or claim another pair's session.
+    """
+    if couple_data.user1_id == couple_data.user2_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A couple needs two different users"
+        )
+    ensure_user_in_couple(creator, couple_data)
+
+    session = await Session.filter(id=couple_data.session_id).using_db(get_write_db()).first()
+    if not session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session not found"
+        )
+    if session.session_mode != "couple":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Couples are formed in couple sessions"
+        )
+    participants = await SessionParticipant.filter(
+        session_id=session.id, user_id__in=[couple_data.user1_id, couple_data.user2_id]
+    ).using_db(get_write_db()).count()
+    if participants != 2:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Both users must be participants of the session"
+        )
+
+    members = await User.filter(
+        id__in=[couple_data.user1_id, couple_data.user2_id], is_active=True
+    ).count()
+    if members != 2:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    try:
+        async with in_transaction("default"):
+            couple = await Couple.create(**couple_data.model_dump())
+            # Never take over a session that already belongs to a couple
+            attached = await Session.filter(id=session.id, couple_id__isnull=True).update(couple_id=couple.id)
+            if not attached:
+                raise IntegrityError("session already has a couple")
+    except IntegrityError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Couple already exists for this session"
+        )
+    return couple
+
+async def get_couple_by_id(couple_id: int, primary: bool = False) -> Optional[Couple]:
+    """Get a couple by its ID."""
+    db = get_write_db() if primary else get_read_db()
+    return await Couple.filter(id=couple_id).using_db(db).first()
+
+async def update_couple(couple: Couple, update_data: CoupleUpdate) -> Couple:
+    """Update a couple and drop its cached context."""
+    fields = update_data.model_dump(exclude_unset=True)
+    if fields:
+        couple.update_from_dict(fields)
+        await couple.save(update_fields=list(fields))
+    invalidate_couple_context(couple.id)
+    return couple
+
+async def get_couple_context(couple_id: int) -> Optional[CoupleContext]:
+    """Get the chat context of an active couple, from cache when possible."""
+    cached = _couple_context_cache.get(couple_id)
+    if cached is not MISSING:
+        return cached
+
+    rows = await get_read_db().execute_query_dict(COUPLE_CONTEXT_SQL, [couple_id])
+    context = None
+    if rows:
+        row = rows[0]
+        context = CoupleContext(
+            couple_id=couple_id,
+            session_id=row["session_id"],
+            names={"A": row["user1_first_name"], "B": row["user2_first_name"]},
+            partners={row["user1_id"]: "A", row["user2_id"]: "B"},
+            agents={
+                "shared": get_couple_agent(couple_id),
+                "A": get_partner_agent(couple_id, "A"),
+                "B": get_partner_agent(couple_id, "B"),
+            },
+        )
+    _couple_context_cache.set(couple_id, context)
+    return context
+
+def invalidate_couple_context(couple_id: int):
+    """Drop the cached context of a couple."""
+    _couple_context_cache.invalidate(couple_id)
+
+def invalidate_couple_contexts_for_user(user_id: int):
+    """Drop cached contexts of every couple the user belongs to (e.g. on rename)."""
+    _couple_context_cache.invalidate_where(
+        lambda _, context: context is not None and user_id in context.partners
+    )
+
+# Validation functions
+def ensure_couple_exists(couple: Optional[Couple]) -> Couple:
+    """Ensure a couple exists or raise 404."""
+    if not couple:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Couple not found"
+        )
+    return couple
+
+def ensure_user_in_couple(user: User, couple: Couple | CoupleCreate):
+    """Ensure the user is one of the two partners or raise 403."""
+    if user.id not in (couple.user1_id, couple.user2_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a member of this couple"
+        )
@@ -0,0 +1,153 @@
+import hashlib
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from app.database import get_write_db
+from app.services.log_utils import log_message
+
+# In-process Bloom filter of registered emails in front of the public
+# GET /users/check-email: an email the filter has never seen is answered
+# without a query, only probable matches go to the database. Each worker
+# builds its own filter in the background at startup (until then every check
+# queries) and adds the emails it registers itself; users created or renamed
+# by other workers are picked up by a refresh every EMAIL_FILTER_REFRESH_INTERVAL
+# seconds, an index range scan on users.updated_at (migration 8). Bloom filters
+# can't forget, so changed or deleted emails stay probable matches (costing one
+# query) until the next full rebuild.
+EMAIL_FILTER_ENABLED = os.getenv("EMAIL_FILTER_ENABLED", "true").lower() == "true"
+EMAIL_FILTER_FALSE_POSITIVE_RATE = float(os.getenv("EMAIL_FILTER_FALSE_POSITIVE_RATE", "0.01"))
+# Sized for twice the current users (at least this many); rebuilt once full
+EMAIL_FILTER_MIN_CAPACITY = int(os.getenv("EMAIL_FILTER_MIN_CAPACITY", "100000"))
+EMAIL_FILTER_REFRESH_INTERVAL = float(os.getenv("EMAIL_FILTER_REFRESH_INTERVAL", "5"))
+EMAIL_FILTER_REBUILD_INTERVAL = float(os.getenv("EMAIL_FILTER_REBUILD_INTERVAL", "86400"))
+EMAIL_FILTER_CHUNK_SIZE = int(os.getenv("EMAIL_FILTER_CHUNK_SIZE", "10000"))
+# Refreshes re-read rows updated this long before the previous one, covering
+# transactions that committed late and clock skew between workers
+EMAIL_FILTER_REFRESH_OVERLAP = timedelta(seconds=60)
+
+UPDATED_EMAILS_SQL = 'SELECT "email" FROM "users" WHERE "updated_at" > $1'
+
+
+def normalize_email(email: str) -> str:
+    # Lookups stay exact in the database; folding case here only makes the
+    # filter a superset of what the query would match
+    return email.strip().lower()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (double hashing of one blake2b digest)."""
+
+    def __init__(self, capacity: int, false_positive_rate: float):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, value: str):
+        # Only values that set a new bit are counted, so re-adding the same
+        # emails on every refresh doesn't make the filter look full
+        new = False
+        for position in self._positions(value):
+            mask = 1 << (position & 7)
+            if not self._bits[position >> 3] & mask:
+                self._bits[position >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+# The current filter; None until the first build finished
+_filter: Optional[BloomFilter] = None
+# Emails registered while a rebuild is running, replayed into the new filter
+_building: Optional[List[str]] = None
+_refreshed_at: Optional[datetime] = None
+_built_at: Optional[datetime] = None
+
+
+def remember_email(email: str):
+    """Add an email this worker just registered (or changed a user to)."""
+    if _filter is not None:
+        _filter.add(normalize_email(email))
+    if _building is not None:
+        _building.append(normalize_email(email))
+
+
+def email_may_exist(email: str) -> bool:
+    """False only when no user has this email; True means "ask the database"."""
+    if _filter is None:
+        return True
+    return normalize_email(email) in _filter
+
+
+async def _add_updated_since(bloom: BloomFilter, since: datetime) -> int:
+    # The primary, so a lagging replica can't hide rows behind the watermark
+    rows = await get_write_db().execute_query_dict(UPDATED_EMAILS_SQL, [since])
+    for row in rows:
+        bloom.add(normalize_email(row["email"]))
+    return len(rows)
+
+
+async def rebuild_email_filter() -> BloomFilter:
+    """Build a new filter from a keyset scan of users and swap it in."""
+    global _filter, _building, _refreshed_at, _built_at
+    started = datetime.now(timezone.utc)
+    _building = []
+    try:
+        db = get_write_db()
+        total = (await db.execute_query_dict('SELECT COUNT(*) AS "count" FROM "users"'))[0]["count"]
+        bloom = BloomFilter(max(EMAIL_FILTER_MIN_CAPACITY, total * 2), EMAIL_FILTER_FALSE_POSITIVE_RATE)
+        last_id = 0
+        while True:
+            rows = await db.execute_query_dict(
+                f'SELECT "id", "email" FROM "users" WHERE "id" > $1 ORDER BY "id" LIMIT {EMAIL_FILTER_CHUNK_SIZE}',
+                [last_id],
+            )
+            if not rows:
+                break
+            for row in rows:
+                bloom.add(normalize_email(row["email"]))
+            last_id = rows[-1]["id"]
+        # Rows changed while the scan ran
+        await _add_updated_since(bloom, started - EMAIL_FILTER_REFRESH_OVERLAP)
+        for email in _building:
+            bloom.add(email)
+        _filter = bloom
+    finally:
+        _building = None
+    _refreshed_at = _built_at = started
+    log_message(
+        "INFO",
+        f"Email filter built: {bloom.count} emails, {bloom.size // 8 // 1024}KB, {bloom.hashes} hashes",
+    )
+    return bloom
+
+
+async def refresh_email_filter():
+    """Periodic job: build the filter, then add users updated since the last run."""
+    global _refreshed_at
+    now = datetime.now(timezone.utc)
+    if (
+        _filter is None
+        or _filter.full
+        or now - _built_at >= timedelta(seconds=EMAIL_FILTER_REBUILD_INTERVAL)
+    ):
+        await rebuild_email_filter()
+        return
+    await _add_updated_since(_filter, _refreshed_at - EMAIL_FILTER_REFRESH_OVERLAP)
+    _refreshed_at = now
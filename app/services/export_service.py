@@ -0,0 +1,160 @@
+import os
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+import orjson
+from fastapi import HTTPException, status
+
+from app.database import get_read_db
+from app.models.user import User
+from app.schemas import MessageExportFilter
+from app.services.couple_service import ensure_couple_exists, ensure_user_in_couple, get_couple_by_id
+from app.services.message_service import ensure_user_in_session
+from app.services.partition_service import (
+    MESSAGE_REHYDRATE_MAX_MONTHS,
+    missing_archived_months,
+    rehydrate_partition,
+)
+
+# Rows fetched per round-trip. Memory use of an export is bounded by one chunk
+# whatever the size of the export.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "1000"))
+
+# Keyset walk in (created_at, id) order: each chunk starts right after the
+# last row of the previous one, so no chunk pays for the rows before it and
+# the (session_id, created_at) / (user_id, created_at) indexes serve the filters.
+EXPORT_SQL = """
+SELECT m."id", m."session_id", s."couple_id", m."user_id", m."sender_type",
+       m."content", m."message_status", m."reply_to_message_id",
+       m."created_at", m."updated_at"
+FROM "messages" m
+JOIN "sessions" s ON s."id" = m."session_id"
+WHERE {where}
+ORDER BY m."created_at", m."id"
+LIMIT {limit}
+"""
+
+
+# Start of the first session an export covers. Messages can't be older, so
+# archived months before it are left alone.
+FIRST_SESSION_SQL = """
+SELECT MIN("created_at") AS "started" FROM "sessions" WHERE {where}
+"""
+
+
+def _where(export_filter: MessageExportFilter) -> tuple[List[str], List[Any]]:
+    """WHERE clauses and their values for the filters that are set."""
+    clauses, values = [], []
+    for clause, value in (
+        ('m."session_id" = ${}', export_filter.session_id),
+        ('s."couple_id" = ${}', export_filter.couple_id),
+        ('m."user_id" = ${}', export_filter.user_id),
+        ('m."created_at" >= ${}', export_filter.since),
+        ('m."created_at" < ${}', export_filter.until),
+    ):
+        if value is not None:
+            values.append(value)
+            clauses.append(clause.format(len(values)))
+    return clauses, values
+
+
+async def archived_months_for_export(export_filter: MessageExportFilter) -> List[datetime]:
+    """Archived months the export reaches that would have to be loaded back."""
+    clauses, values = [], []
+    for clause, value in (
+        ('"id" = ${}', export_filter.session_id),
+        ('"couple_id" = ${}', export_filter.couple_id),
+        ('"id" IN (SELECT "session_id" FROM "session_participants" WHERE "user_id" = ${})', export_filter.user_id),
+    ):
+        if value is not None:
+            values.append(value)
+            clauses.append(clause.format(len(values)))
+
+    since = export_filter.since
+    if clauses:
+        rows = await get_read_db().execute_query_dict(FIRST_SESSION_SQL.format(where=" AND ".join(clauses)), values)
+        started = rows[0]["started"]
+        if started is None:
+            # No sessions, so no messages either
+            return []
+        since = max(since, started) if since else started
+    return await missing_archived_months(since, export_filter.until)
+
+
+async def iter_messages(
+    export_filter: MessageExportFilter,
+    chunk_size: int = EXPORT_CHUNK_SIZE,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield matching messages oldest first, one chunk in memory at a time.
+
+    Archived months the export reaches are loaded back first; API exports
+    are limited to MESSAGE_REHYDRATE_MAX_MONTHS of them by ensure_export_allowed.
+    """
+    for month in await archived_months_for_export(export_filter):
+        await rehydrate_partition(month)
+
+    clauses, values = _where(export_filter)
+    db = get_read_db()
+    last = None
+    while True:
+        page_clauses, page_values = list(clauses), list(values)
+        if last is not None:
+            page_values += [last["created_at"], last["id"]]
+            n = len(page_values)
+            page_clauses.append(f'(m."created_at", m."id") > (${n - 1}, ${n})')
+        sql = EXPORT_SQL.format(where=" AND ".join(page_clauses) or "TRUE", limit=int(chunk_size))
+        rows = await db.execute_query_dict(sql, page_values)
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+
+
+async def iter_ndjson(
+    export_filter: MessageExportFilter,
+    compress: bool = False,
+) -> AsyncIterator[bytes]:
+    """Yield the export as NDJSON, one chunk of rows per piece, optionally gzipped."""
+    gzip = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+    buffer = bytearray()
+    async for row in iter_messages(export_filter):
+        buffer += orjson.dumps(row)
+        buffer += b"\n"
+        if len(buffer) >= 64 * 1024:
+            yield gzip.compress(bytes(buffer)) if gzip else bytes(buffer)
+            buffer.clear()
+    if gzip:
+        yield gzip.compress(bytes(buffer)) + gzip.flush()
+    elif buffer:
+        yield bytes(buffer)
+
+
+# Validation functions
+async def ensure_export_allowed(user: User, export_filter: MessageExportFilter):
+    """API exports are limited to data the user takes part in; the CLI is not."""
+    if export_filter.session_id is None and export_filter.couple_id is None and export_filter.user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Export needs a session_id, couple_id or user_id filter"
+        )
+    if export_filter.user_id is not None and export_filter.user_id != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to export another user's messages"
+        )
+    if export_filter.session_id is not None:
+        await ensure_user_in_session(user, export_filter.session_id)
+    if export_filter.couple_id is not None:
+        couple = ensure_couple_exists(await get_couple_by_id(export_filter.couple_id))
+        ensure_user_in_couple(user, couple)
+    archived = await archived_months_for_export(export_filter)
+    if len(archived) > MESSAGE_REHYDRATE_MAX_MONTHS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Export reaches {len(archived)} archived months; narrow it with since/until "
+                f"(at most {MESSAGE_REHYDRATE_MAX_MONTHS} per export)"
+            )
+        )
@@ -0,0 +1,248 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+import orjson
+
+from app.monitoring.tracing import KIND_CLIENT, span
+from app.schemas import MemoryImportStatus
+from app.services.couple_service import get_couple_context
+from app.services.log_utils import log_message
+from app.services.memory_service import (
+    MEMORY_SEARCH_TIMEOUT,
+    client,
+    format_memory_entry,
+    get_individual_agent,
+    invalidate_memory_snapshot,
+)
+
+# Transcript lines are grouped per memory space into client.add calls of up to
+# IMPORT_BATCH_SIZE messages, and up to IMPORT_CONCURRENCY calls run at once.
+# The input is consumed one window of IMPORT_BATCH_SIZE x IMPORT_CONCURRENCY
+# lines at a time, and the checkpoint advances only once a whole window is
+# written, so an interrupted import resumes from the last complete window.
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "20"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "4"))
+IMPORT_RETRIES = int(os.getenv("IMPORT_RETRIES", "3"))
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv("IMPORT_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+# mem0 infers memories from a whole batch, give it more time than a search
+IMPORT_ADD_TIMEOUT = MEMORY_SEARCH_TIMEOUT * 12
+
+# Import jobs started through the API, by job id (per worker process)
+_jobs: Dict[str, MemoryImportStatus] = {}
+_job_owners: Dict[str, int] = {}
+_running: set[asyncio.Task] = set()
+
+
+def _open(path: str):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+
+def _read_lines(handle, count: int) -> List[bytes]:
+    lines = []
+    for line in handle:
+        lines.append(line)
+        if len(lines) == count:
+            break
+    return lines
+
+
+def _skip_lines(handle, count: int):
+    for _ in range(count):
+        if not handle.readline():
+            break
+
+
+def _load_checkpoint(checkpoint_path: str) -> Dict[str, Any]:
+    try:
+        with open(checkpoint_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"line": 0, "memories_imported": 0, "skipped": 0}
+
+
+def _save_checkpoint(checkpoint_path: str, progress: MemoryImportStatus):
+    # Write-then-rename so a crash never leaves a truncated checkpoint
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "line": progress.lines_read,
+            "memories_imported": progress.memories_imported,
+            "skipped": progress.skipped,
+        }, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+async def map_transcript_line(record: Dict[str, Any]) -> Optional[tuple[List[str], str]]:
+    """Memory spaces and entry text for one transcript line, None to skip it.
+
+    Lines look like the NDJSON export: `content`, `user_id`, optional
+    `couple_id`, and `sender_type` ("human" | "ai") or `role` ("user" |
+    "assistant"). Couple lines may name the `partner` ("A" | "B") instead of
+    the user. As in send_message, only what the users said is stored: in the
+    couple's shared space plus the speaking partner's space, or in the user's
+    individual space.
+    """
+    content = record.get("content")
+    if not content or record.get("sender_type", "human") != "human" or record.get("role", "user") != "user":
+        return None
+
+    couple_id = record.get("couple_id")
+    if couple_id is None:
+        user_id = record.get("user_id")
+        if user_id is None:
+            return None
+        return [get_individual_agent(int(user_id))], format_memory_entry(content, is_individual=True)
+
+    context = await get_couple_context(int(couple_id))
+    if not context:
+        return None
+    partner = record.get("partner") or context.partners.get(record.get("user_id"))
+    if partner not in ("A", "B"):
+        return None
+    entry = format_memory_entry(content, partner, context.names)
+    return [context.agents["shared"], context.agents[partner]], entry
+
+
+async def _add_batch(agent_id: str, entries: List[str], semaphore: asyncio.Semaphore):
+    messages = [{"role": "user", "content": entry} for entry in entries]
+    async with semaphore:
+        for attempt in range(1, IMPORT_RETRIES + 1):
+            try:
+                # The mem0 client is synchronous; keep it off the event loop
+                with span("mem0.add", KIND_CLIENT, **{"memory.agent_id": agent_id, "memory.batch_size": len(messages)}):
+                    await asyncio.wait_for(
+                        asyncio.to_thread(client.add, messages, agent_id=agent_id, metadata={"imported": True}),
+                        timeout=IMPORT_ADD_TIMEOUT,
+                    )
+                return
+            except Exception as e:
+                if attempt == IMPORT_RETRIES:
+                    raise
+                log_message("IMPORT", f"⚠️ Batch for {agent_id} failed (attempt {attempt}): {e!r}, retrying")
+                await asyncio.sleep(2 ** attempt)
+
+
+async def import_transcripts(
+    path: str,
+    progress: MemoryImportStatus,
+    checkpoint_path: Optional[str] = None,
+    allowed: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> MemoryImportStatus:
+    """Stream an NDJSON transcript file (optionally .gz) into the memory spaces.
+
+    Resumes from `checkpoint_path` (default `<path>.checkpoint`) when present.
+    `allowed`, if given, filters lines before they are mapped; rejected and
+    unmappable lines count as skipped. `progress` is updated in place.
+    """
+    checkpoint_path = checkpoint_path or f"{path}.checkpoint"
+    checkpoint = _load_checkpoint(checkpoint_path)
+    progress.lines_read = checkpoint["line"]
+    progress.memories_imported = checkpoint["memories_imported"]
+    progress.skipped = checkpoint["skipped"]
+    if progress.lines_read:
+        log_message("IMPORT", f"Resuming {path} after line {progress.lines_read}")
+
+    semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+    window = IMPORT_BATCH_SIZE * IMPORT_CONCURRENCY
+    started = time.monotonic()
+    imported_this_run = 0
+    with _open(path) as handle:
+        await asyncio.to_thread(_skip_lines, handle, progress.lines_read)
+        while True:
+            lines = await asyncio.to_thread(_read_lines, handle, window)
+            if not lines:
+                break
+
+            batches: Dict[str, List[str]] = defaultdict(list)
+            for line in lines:
+                try:
+                    record = orjson.loads(line)
+                    mapped = await map_transcript_line(record) if allowed is None or allowed(record) else None
+                except (orjson.JSONDecodeError, TypeError, ValueError):
+                    mapped = None
+                if mapped is None:
+                    if line.strip():
+                        progress.skipped += 1
+                    continue
+                agent_ids, entry = mapped
+                for agent_id in agent_ids:
+                    batches[agent_id].append(entry)
+
+            await asyncio.gather(*(
+                _add_batch(agent_id, entries[start:start + IMPORT_BATCH_SIZE], semaphore)
+                for agent_id, entries in batches.items()
+                for start in range(0, len(entries), IMPORT_BATCH_SIZE)
+            ))
+            invalidate_memory_snapshot(*batches)
+
+            written = sum(len(entries) for entries in batches.values())
+            imported_this_run += written
+            progress.lines_read += len(lines)
+            progress.memories_imported += written
+            progress.memories_per_second = round(imported_this_run / max(time.monotonic() - started, 1e-6), 1)
+            _save_checkpoint(checkpoint_path, progress)
+            log_message(
+                "IMPORT",
+                f"{progress.lines_read} lines, {progress.memories_imported} memories, "
+                f"{progress.skipped} skipped ({progress.memories_per_second} memories/s)",
+            )
+
+    progress.status = "completed"
+    progress.finished_at = datetime.now(timezone.utc)
+    return progress
+
+
+def get_import_job(job_id: str, owner_id: Optional[int] = None) -> Optional[MemoryImportStatus]:
+    """Status of an import started with `start_import_job` in this worker.
+
+    With `owner_id`, jobs started by anyone else are not found.
+    """
+    if owner_id is not None and _job_owners.get(job_id) != owner_id:
+        return None
+    return _jobs.get(job_id)
+
+
+def start_import_job(
+    path: str,
+    allowed: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    remove_when_done: bool = True,
+    owner_id: Optional[int] = None,
+) -> MemoryImportStatus:
+    """Run `import_transcripts` as a background task and return its status.
+
+    The (uploaded) file and its checkpoint are removed once the import
+    completes or fails.
+    """
+    progress = MemoryImportStatus(job_id=uuid.uuid4().hex, started_at=datetime.now(timezone.utc))
+    _jobs[progress.job_id] = progress
+    if owner_id is not None:
+        _job_owners[progress.job_id] = owner_id
+
+    async def run():
+        try:
+            await import_transcripts(path, progress, allowed=allowed)
+        except Exception as e:
+            progress.status = "failed"
+            progress.error = repr(e)
+            progress.finished_at = datetime.now(timezone.utc)
+            log_message("ERROR", f"Import job {progress.job_id} failed: {e!r}")
+        finally:
+            if remove_when_done:
+                for leftover in (path, f"{path}.checkpoint"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+
+    # Keep a reference: the loop only holds weak ones to running tasks
+    task = asyncio.create_task(run(), name=f"import_{progress.job_id}")
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+    return progress
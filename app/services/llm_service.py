@@ -0,0 +1,60 @@
+import os
+
+from anthropic import Anthropic
+from dotenv import load_dotenv
+
+from app.monitoring.tracing import KIND_CLIENT, span
+from app.services.log_utils import log_message
+
+load_dotenv()
+
+anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+LLM_MODEL = "claude-3-haiku-20240307"
+
+
+def complete(full_prompt: str, max_tokens: int = 1000) -> str:
+    """Send a single-turn prompt and return the text of the reply.
+
+    Raises on API errors and empty replies, for callers (background jobs)
+    that must not mistake a failure for model output.
+    """
+    log_message("LLM", "Sending request to Claude 3 Haiku...")
+    with span("llm.complete", KIND_CLIENT, **{"llm.model": LLM_MODEL, "llm.prompt_chars": len(full_prompt)}) as llm_span:
+        response = anthropic_client.messages.create(
+            model=LLM_MODEL,
+            max_tokens=max_tokens,
+            messages=[
+                {
+                    "role": "user",
+                    "content": full_prompt
+                }
+            ]
+        )
+        if llm_span and getattr(response, "usage", None):
+            llm_span.set_attribute("llm.input_tokens", response.usage.input_tokens)
+            llm_span.set_attribute("llm.output_tokens", response.usage.output_tokens)
+
+    log_message("LLM", "Received response from Claude 3 Haiku")
+
+    # Extract text content from the response
+    if not response.content:
+        raise ValueError("Empty response received")
+    content_block = response.content[0]
+    if hasattr(content_block, 'text'):
+        log_message("LLM", "✅ Successfully extracted text from response")
+        return content_block.text
+    log_message("LLM", f"⚠️ Unexpected content block type: {type(content_block)}")
+    return str(content_block)
+
+
+def call_llm(full_prompt):
+    """Chat reply for the user; failures become an apology instead of an error."""
+    try:
+        return complete(full_prompt)
+    except ValueError:
+        log_message("LLM", "❌ Empty response received")
+        return "I apologize, but I received an empty response. Please try again."
+    except Exception as e:
+        log_message("ERROR", f"Error calling Claude 3 Haiku: {e}")
+        return "I apologize, but I'm having trouble processing your request right now. Please try again later."
@@ -0,0 +1,7 @@
+from datetime import datetime
+
+
+def log_message(level: str, message: str):
+    """Helper function to log messages with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    print(f"[{timestamp}] [{level}] {message}")
@@ -0,0 +1,224 @@
+import asyncio
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+from mem0 import MemoryClient
+
+from app.database import get_read_db
+from app.monitoring.tracing import KIND_CLIENT, span, traced
+from app.services.cache import TTLCache, MISSING
+from app.services.log_utils import log_message
+
+load_dotenv()
+
+client = MemoryClient(api_key=os.getenv("MEM0_API_KEY"))
+
+# Which retrieval tiers `search_memories` uses:
+#   "mem0"        remote semantic search, Postgres full-text as fallback on error/timeout
+#   "local_first" Postgres full-text first, mem0 only when it finds too little
+#   "postgres"    Postgres full-text only
+MEMORY_SEARCH_BACKEND = os.getenv("MEMORY_SEARCH_BACKEND", "mem0")
+MEMORY_SEARCH_TIMEOUT = float(os.getenv("MEMORY_SEARCH_TIMEOUT", "5"))
+MEMORY_SEARCH_LIMIT = int(os.getenv("MEMORY_SEARCH_LIMIT", "10"))
+MEMORY_LOCAL_MIN_RESULTS = int(os.getenv("MEMORY_LOCAL_MIN_RESULTS", "3"))
+
+# Snapshots of whole memory spaces fetched ahead of the first message of a
+# session (see prefetch_service). A space with no more than
+# MEMORY_SEARCH_LIMIT memories is answered from its snapshot: a remote search
+# could not return anything else. Dropped when this worker writes to the space;
+# writes made through other workers (a partner on another instance, an
+# import) only show up once the snapshot expires, so the TTL stays short:
+# long enough to cover the first message after opening a session.
+MEMORY_PREFETCH_TTL = float(os.getenv("MEMORY_PREFETCH_TTL", "10"))
+_memory_snapshots = TTLCache(ttl_seconds=MEMORY_PREFETCH_TTL)
+
+# Agent ids name the memory spaces used for retrieval and storage.
+
+def get_couple_ai_agent(couple_id: int) -> str:
+    return f"couple_{couple_id}"
+
+
+def get_partner_agent(couple_id: int, partner: str) -> str:
+    """Get agent ID for a specific partner within a couple"""
+    return f"couple_{couple_id}_{partner}"
+
+
+def get_couple_agent(couple_id: int) -> str:
+    """Get the main couple agent for shared memories"""
+    return f"couple_{couple_id}_shared"
+
+
+def get_individual_agent(user_id: int) -> str:
+    """Get agent ID for individual therapy"""
+    return f"individual_{user_id}"
+
+
+def format_memory_entry(
+    user_message: str,
+    partner: Optional[str] = None,
+    couple_names: Optional[Dict[str, str]] = None,
+    is_individual: bool = False,
+) -> str:
+    """Text stored in a memory space for one user message, prefixed with the speaker."""
+    if is_individual:
+        return f"User: {user_message}"
+    # Couples therapy - add partner name and context
+    if couple_names and partner:
+        partner_name = couple_names.get(partner, f"Partner {partner}")
+        return f"{partner_name}: {user_message}"
+    partner_prefix = f"Partner {partner}: " if partner else ""
+    return f"{partner_prefix}{user_message}"
+
+
+_INDIVIDUAL_AGENT = re.compile(r"^individual_(\d+)$")
+_COUPLE_AGENT = re.compile(r"^couple_(\d+)_(shared|A|B)$")
+
+
+class PostgresMessageSearch:
+    """Full-text retrieval over the stored `messages` table.
+
+    Uses the generated `search_vector` column and its GIN index. Results have
+    the same shape as mem0 search results (`{"memory": ..., "score": ...}`) so
+    they can be fed to `construct_prompt` unchanged.
+    """
+
+    # Terms are OR-ed: a chat message used as a query rarely has every word
+    # in common with a past message, ranking sorts out the best matches.
+    SEARCH_SQL = """
+    SELECT m."id", m."content", m."user_id", m."session_id", m."created_at",
+           ts_rank_cd(m."search_vector", q.query) AS "score"
+    FROM "messages" m
+    JOIN "sessions" s ON s."id" = m."session_id",
+         (SELECT NULLIF(replace(plainto_tsquery('english', $1)::text, '&', '|'), '')::tsquery AS query) q
+    WHERE m."search_vector" @@ q.query
+      AND m."sender_type" = 'human'
+      AND {scope}
+    ORDER BY "score" DESC, m."created_at" DESC
+    LIMIT {limit}
+    """
+
+    async def search(
+        self,
+        query: str,
+        agent_id: Optional[str] = None,
+        session_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        limit: int = MEMORY_SEARCH_LIMIT,
+    ) -> List[Dict[str, Any]]:
+        """Search stored messages of a memory space, a session or a user."""
+        scope, values = await self._scope(agent_id, session_id, user_id)
+        if scope is None:
+            return []
+
+        sql = self.SEARCH_SQL.format(scope=scope, limit=int(limit))
+        rows = await get_read_db().execute_query_dict(sql, [query, *values])
+        return [
+            {
+                "id": f"message_{row['id']}",
+                "memory": row["content"],
+                "score": float(row["score"]),
+                "created_at": row["created_at"].isoformat(),
+                "source": "postgres",
+            }
+            for row in rows
+        ]
+
+    async def _scope(self, agent_id, session_id, user_id) -> tuple[Optional[str], list]:
+        """Translate a memory space into a WHERE clause over messages/sessions."""
+        if session_id is not None:
+            return 'm."session_id" = $2', [session_id]
+        if user_id is not None:
+            return 'm."user_id" = $2', [user_id]
+        if not agent_id:
+            return None, []
+
+        match = _INDIVIDUAL_AGENT.match(agent_id)
+        if match:
+            return 'm."user_id" = $2 AND s."session_mode" = \'solo\'', [int(match.group(1))]
+
+        match = _COUPLE_AGENT.match(agent_id)
+        if match:
+            couple_id, space = int(match.group(1)), match.group(2)
+            if space == "shared":
+                return 's."couple_id" = $2', [couple_id]
+            # Imported here: couple_service depends on this module for agent ids
+            from app.services.couple_service import get_couple_context
+            context = await get_couple_context(couple_id)
+            partner_user = next(
+                (uid for uid, letter in (context.partners if context else {}).items() if letter == space),
+                None,
+            )
+            if partner_user is None:
+                return None, []
+            return 's."couple_id" = $2 AND m."user_id" = $3', [couple_id, partner_user]
+
+        return None, []
+
+
+postgres_search = PostgresMessageSearch()
+
+
+def as_memory_list(result: Any) -> List[Dict[str, Any]]:
+    # Depending on the API version get_all returns a list or {"results": [...]}
+    if isinstance(result, dict):
+        return result.get("results", [])
+    return result or []
+
+
+async def prefetch_memory_space(agent_id: str):
+    """Fetch a snapshot of a memory space unless a fresh one is cached."""
+    if agent_id in _memory_snapshots:
+        return
+    with span("mem0.get_all", KIND_CLIENT, **{"memory.agent_id": agent_id}):
+        memories = await asyncio.wait_for(
+            asyncio.to_thread(client.get_all, agent_id=agent_id),
+            timeout=MEMORY_SEARCH_TIMEOUT,
+        )
+    _memory_snapshots.set(agent_id, as_memory_list(memories))
+
+
+def invalidate_memory_snapshot(*agent_ids: str):
+    """Drop snapshots of memory spaces that were just written to."""
+    _memory_snapshots.invalidate(*agent_ids)
+
+
+async def _search_mem0(query: str, agent_id: str) -> List[Dict[str, Any]]:
+    snapshot = _memory_snapshots.get(agent_id)
+    if snapshot is not MISSING and len(snapshot) <= MEMORY_SEARCH_LIMIT:
+        return snapshot
+
+    # The mem0 client is synchronous; keep it off the event loop
+    with span("mem0.search", KIND_CLIENT, **{"memory.agent_id": agent_id}):
+        return await asyncio.wait_for(
+            asyncio.to_thread(client.search, query, agent_id=agent_id),
+            timeout=MEMORY_SEARCH_TIMEOUT,
+        )
+
+
+@traced("memory.search")
+async def search_memories(query: str, agent_id: str) -> List[Dict[str, Any]]:
+    """Search a memory space through the configured retrieval tiers."""
+    if MEMORY_SEARCH_BACKEND == "postgres":
+        return await postgres_search.search(query, agent_id)
+
+    if MEMORY_SEARCH_BACKEND == "local_first":
+        local = await postgres_search.search(query, agent_id)
+        if len(local) >= MEMORY_LOCAL_MIN_RESULTS:
+            return local
+        try:
+            return await _search_mem0(query, agent_id) or local
+        except Exception as e:
+            log_message("ERROR", f"mem0 search failed for {agent_id}, using local results: {e!r}")
+            return local
+
+    try:
+        return await _search_mem0(query, agent_id)
+    except Exception as e:
+        log_message("ERROR", f"mem0 search failed for {agent_id}, falling back to Postgres: {e!r}")
+    try:
+        return await postgres_search.search(query, agent_id)
+    except Exception as e:
+        log_message("ERROR", f"Postgres search failed for {agent_id}: {e!r}")
+        return []
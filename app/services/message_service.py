@@ -0,0 +1,80 @@
+from datetime import datetime
+from fastapi import HTTPException, status
+from typing import Optional, List
+
+from app.database import get_read_db, get_write_db
+from app.models.message import Message
+from app.models.session import Session
+from app.models.session_participant import SessionParticipant
+from app.models.user import User
+from app.services.cache import MISSING, TTLCache
+from app.services.partition_service import (
+    MESSAGE_REHYDRATE_MAX_MONTHS,
+    get_archive_end,
+    rehydrate_message_range,
+)
+from app.services.session_service import touch_session
+
+# Session start times, for deciding whether history can reach the archives.
+# created_at never changes, so entries only expire to bound memory.
+_session_starts = TTLCache(ttl_seconds=3600)
+
+async def _get_session_start(session_id: int) -> Optional[datetime]:
+    started = _session_starts.get(session_id)
+    if started is MISSING:
+        started = await Session.filter(id=session_id).using_db(get_read_db()).first().values_list("created_at", flat=True)
+        _session_starts.set(session_id, started)
+    return started
+
+async def get_session_messages(
+    session_id: int,
+    limit: int = 50,
+    before_id: Optional[int] = None,
+) -> List[Message]:
+    """Get a page of a session's message history, oldest first.
+
+    Pages walk backwards from the newest message; pass the smallest id of the
+    previous page as `before_id` to load older messages. A short page of a
+    session older than the archived months loads those months back first.
+    """
+    query = Message.filter(session_id=session_id)
+    if before_id is not None:
+        query = query.filter(id__lt=before_id)
+    query = query.order_by("-created_at", "-id").limit(limit)
+    messages = await query.using_db(get_read_db())
+    if len(messages) < limit:
+        # Only sessions started before the end of the newest archived month
+        # can have history in the archives
+        archive_end = await get_archive_end()
+        started = await _get_session_start(session_id) if archive_end else None
+        if started and started < archive_end:
+            until = messages[-1].created_at if messages else None
+            if await rehydrate_message_range(started, until, max_months=MESSAGE_REHYDRATE_MAX_MONTHS):
+                # Rows were just written; don't wait for a replica to catch up
+                messages = await query.using_db(get_write_db())
+    return list(reversed(messages))
+
+async def save_exchange(
+    session_id: int,
+    user_id: int,
+    user_message: str,
+    ai_response: str,
+) -> None:
+    """Persist one chat turn (the user's message and the AI reply) in one INSERT."""
+    await Message.bulk_create([
+        Message(session_id=session_id, user_id=user_id, content=user_message, sender_type="human"),
+        Message(session_id=session_id, user_id=user_id, content=ai_response, sender_type="ai"),
+    ])
+    await touch_session(session_id)
+
+# Validation functions
+async def ensure_user_in_session(user: User, session_id: int):
+    """Ensure the user has taken part in the session or raise 403."""
+    is_participant = await SessionParticipant.filter(
+        session_id=session_id, user_id=user.id
+    ).using_db(get_read_db()).exists()
+    if not is_participant:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not a participant of this session"
+        )
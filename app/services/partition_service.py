@@ -0,0 +1,288 @@
+import asyncio
+import gzip
+import os
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import orjson
+from tortoise import connections
+from tortoise.transactions import in_transaction
+
+from app.services.cache import MISSING, TTLCache
+from app.services.log_utils import log_message
+
+# "messages" is range-partitioned by UTC month (messages_pYYYYMM, see migration
+# 7). maintain_message_partitions() keeps MONTHS_AHEAD future partitions
+# created and, when MESSAGE_ARCHIVE_AFTER_MONTHS > 0, moves partitions older
+# than that to gzipped NDJSON files in MESSAGE_ARCHIVE_DIR and drops them.
+# Archived months are loaded back on demand by rehydrate_message_range().
+#
+# Archives are plain local files: only enable archival on a single instance,
+# or point MESSAGE_ARCHIVE_DIR at storage every instance shares.
+MESSAGE_PARTITION_MAINTENANCE_ENABLED = os.getenv("MESSAGE_PARTITION_MAINTENANCE_ENABLED", "true").lower() == "true"
+MESSAGE_PARTITION_INTERVAL = float(os.getenv("MESSAGE_PARTITION_INTERVAL", "3600"))
+MESSAGE_PARTITION_MONTHS_AHEAD = int(os.getenv("MESSAGE_PARTITION_MONTHS_AHEAD", "3"))
+MESSAGE_ARCHIVE_AFTER_MONTHS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_MONTHS", "0"))
+MESSAGE_ARCHIVE_DIR = os.getenv("MESSAGE_ARCHIVE_DIR", "archive")
+# A rehydrated month stays attached this long before it is archived again
+MESSAGE_REHYDRATE_KEEP_DAYS = float(os.getenv("MESSAGE_REHYDRATE_KEEP_DAYS", "7"))
+MESSAGE_ARCHIVE_CHUNK_SIZE = int(os.getenv("MESSAGE_ARCHIVE_CHUNK_SIZE", "5000"))
+# Most archived months a single request may load back
+MESSAGE_REHYDRATE_MAX_MONTHS = int(os.getenv("MESSAGE_REHYDRATE_MAX_MONTHS", "3"))
+# Seconds each worker caches the listing of MESSAGE_ARCHIVE_DIR
+MESSAGE_ARCHIVE_LIST_TTL = float(os.getenv("MESSAGE_ARCHIVE_LIST_TTL", "60"))
+
+ARCHIVE_COLUMNS = [
+    "id", "session_id", "user_id", "content", "sender_type", "message_status",
+    "reply_to_message_id", "created_at", "updated_at",
+]
+_TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+PARTITIONS_SQL = """
+SELECT c."relname" AS "name", obj_description(c."oid", 'pg_class') AS "comment"
+FROM "pg_inherits" i
+JOIN "pg_class" c ON c."oid" = i."inhrelid"
+WHERE i."inhparent" = '"messages"'::regclass AND c."relname" ~ '^messages_p[0-9]{6}$'
+ORDER BY c."relname"
+"""
+
+REHYDRATED_PREFIX = "rehydrated:"
+
+_archive_listing = TTLCache(MESSAGE_ARCHIVE_LIST_TTL, max_entries=1)
+
+
+def month_start(moment: datetime) -> datetime:
+    moment = moment.astimezone(timezone.utc) if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> datetime:
+    return datetime.strptime(name[len("messages_p"):], "%Y%m").replace(tzinfo=timezone.utc)
+
+
+def archive_path(name: str) -> str:
+    return os.path.join(MESSAGE_ARCHIVE_DIR, f"{name}.ndjson.gz")
+
+
+def _create_partition_sql(month: datetime) -> str:
+    # DDL takes no bind parameters; both values are generated here
+    return (
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" PARTITION OF "messages" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+async def _lock(conn, key: str, wait: bool = True) -> bool:
+    """Transaction-scoped advisory lock, so workers don't run the same DDL twice."""
+    function = "pg_advisory_xact_lock" if wait else "pg_try_advisory_xact_lock"
+    rows = await conn.execute_query_dict(f'SELECT {function}(hashtext($1))::text AS "locked"', [key])
+    return rows[0]["locked"] != "false"
+
+
+async def get_attached_partitions() -> dict:
+    """Monthly partitions currently attached, name -> table comment."""
+    rows = await connections.get("default").execute_query_dict(PARTITIONS_SQL)
+    return {row["name"]: row["comment"] for row in rows}
+
+
+async def ensure_message_partitions(months_ahead: int = MESSAGE_PARTITION_MONTHS_AHEAD) -> List[str]:
+    """Create the partitions of this month and the next `months_ahead` ones."""
+    current = month_start(datetime.now(timezone.utc))
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    attached = await get_attached_partitions()
+    missing = [month for month in months if partition_name(month) not in attached]
+    if missing:
+        async with in_transaction("default") as conn:
+            await _lock(conn, "messages_partitions")
+            for month in missing:
+                await conn.execute_script(_create_partition_sql(month))
+        log_message("PARTITION", f"Created {', '.join(map(partition_name, missing))}")
+    return [partition_name(month) for month in missing]
+
+
+def _write(handle, data: bytes):
+    handle.write(data)
+
+
+async def archive_partition(name: str) -> Optional[int]:
+    """Write one partition to its archive file, then detach and drop it.
+
+    Runs in one transaction that blocks writes to the partition, and the file
+    is only renamed into place once its row count matches, so a failure at
+    any point leaves the partition attached. Returns the rows archived, or
+    None if another worker holds the partition.
+    """
+    os.makedirs(MESSAGE_ARCHIVE_DIR, exist_ok=True)
+    path = archive_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    columns = ", ".join(f'"{column}"' for column in ARCHIVE_COLUMNS)
+    written = 0
+    async with in_transaction("default") as conn:
+        if not await _lock(conn, f"archive_{name}", wait=False):
+            return None
+        await conn.execute_script(f'LOCK TABLE "{name}" IN SHARE MODE')
+        compressor = zlib.compressobj(wbits=31)
+        try:
+            with open(tmp_path, "wb") as handle:
+                last_id = 0
+                while True:
+                    rows = await conn.execute_query_dict(
+                        f'SELECT {columns} FROM "{name}" WHERE "id" > $1 ORDER BY "id" LIMIT {MESSAGE_ARCHIVE_CHUNK_SIZE}',
+                        [last_id],
+                    )
+                    if not rows:
+                        break
+                    data = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+                    await asyncio.to_thread(_write, handle, compressor.compress(data))
+                    written += len(rows)
+                    last_id = rows[-1]["id"]
+                await asyncio.to_thread(_write, handle, compressor.flush())
+                await asyncio.to_thread(os.fsync, handle.fileno())
+
+            count = await conn.execute_query_dict(f'SELECT COUNT(*) AS "count" FROM "{name}"')
+            if count[0]["count"] != written:
+                raise RuntimeError(f"{name}: wrote {written} rows, partition has {count[0]['count']}")
+            os.replace(tmp_path, path)
+            _archive_listing.invalidate("months")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        await conn.execute_script(f'ALTER TABLE "messages" DETACH PARTITION "{name}"')
+        await conn.execute_script(f'DROP TABLE "{name}"')
+    log_message("PARTITION", f"✅ Archived {name} ({written} messages) to {path}")
+    return written
+
+
+async def archive_old_partitions(after_months: int = MESSAGE_ARCHIVE_AFTER_MONTHS) -> List[str]:
+    """Archive every partition that ended more than `after_months` months ago."""
+    if after_months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.now(timezone.utc)), -after_months)
+    keep_after = datetime.now(timezone.utc) - timedelta(days=MESSAGE_REHYDRATE_KEEP_DAYS)
+    archived = []
+    for name, comment in (await get_attached_partitions()).items():
+        if add_months(partition_month(name), 1) > cutoff:
+            continue
+        if comment and comment.startswith(REHYDRATED_PREFIX):
+            if datetime.fromisoformat(comment[len(REHYDRATED_PREFIX):]) > keep_after:
+                continue
+        if await archive_partition(name) is not None:
+            archived.append(name)
+    return archived
+
+
+def _read_records(handle, count: int) -> List[tuple]:
+    records = []
+    for line in handle:
+        row = orjson.loads(line)
+        for column in _TIMESTAMP_COLUMNS:
+            row[column] = datetime.fromisoformat(row[column])
+        records.append(tuple(row[column] for column in ARCHIVE_COLUMNS))
+        if len(records) == count:
+            break
+    return records
+
+
+async def rehydrate_partition(month: datetime) -> int:
+    """Load an archived month back into "messages"; returns the rows loaded."""
+    name = partition_name(month)
+    path = archive_path(name)
+    if not os.path.exists(path):
+        return 0
+
+    loaded = 0
+    async with in_transaction("default") as conn:
+        await _lock(conn, "messages_partitions")
+        if name in await get_attached_partitions():
+            # Another request got there first
+            return 0
+        await conn.execute_script(_create_partition_sql(month))
+        await conn.execute_script(
+            f"COMMENT ON TABLE \"{name}\" IS '{REHYDRATED_PREFIX}{datetime.now(timezone.utc).isoformat()}'"
+        )
+        # COPY straight into the partition, one chunk of the file at a time;
+        # the generated search_vector is computed on the way in
+        with gzip.open(path, "rb") as handle:
+            async with conn.acquire_connection() as raw:
+                while True:
+                    records = await asyncio.to_thread(_read_records, handle, MESSAGE_ARCHIVE_CHUNK_SIZE)
+                    if not records:
+                        break
+                    await raw.copy_records_to_table(name, records=records, columns=ARCHIVE_COLUMNS)
+                    loaded += len(records)
+    log_message("PARTITION", f"✅ Rehydrated {name} ({loaded} messages)")
+    return loaded
+
+
+def archived_months() -> List[datetime]:
+    """Months whose partition is on disk in MESSAGE_ARCHIVE_DIR."""
+    if not os.path.isdir(MESSAGE_ARCHIVE_DIR):
+        return []
+    return sorted(
+        partition_month(entry[:-len(".ndjson.gz")])
+        for entry in os.listdir(MESSAGE_ARCHIVE_DIR)
+        if entry.startswith("messages_p") and entry.endswith(".ndjson.gz")
+    )
+
+
+async def get_archived_months() -> List[datetime]:
+    """archived_months(), listed off the event loop and cached per worker."""
+    months = _archive_listing.get("months")
+    if months is MISSING:
+        months = await asyncio.to_thread(archived_months)
+        _archive_listing.set("months", months)
+    return months
+
+
+async def get_archive_end() -> Optional[datetime]:
+    """End of the newest archived month: nothing after it was ever archived."""
+    months = await get_archived_months()
+    return add_months(months[-1], 1) if months else None
+
+
+async def missing_archived_months(since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[datetime]:
+    """Archived months overlapping [since, until) that aren't attached, oldest first."""
+    months = [
+        month for month in await get_archived_months()
+        if (since is None or add_months(month, 1) > since) and (until is None or month < until)
+    ]
+    if not months:
+        return []
+    attached = await get_attached_partitions()
+    return [month for month in months if partition_name(month) not in attached]
+
+
+async def rehydrate_message_range(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_months: Optional[int] = None,
+) -> int:
+    """Make sure archived months overlapping [since, until) are attached again.
+
+    With `max_months`, only that many of the newest missing months are loaded.
+    Returns the rows loaded.
+    """
+    months = await missing_archived_months(since, until)
+    if max_months is not None:
+        months = months[-max_months:] if max_months > 0 else []
+    loaded = 0
+    for month in months:
+        loaded += await rehydrate_partition(month)
+    return loaded
+
+
+async def maintain_message_partitions():
+    """Periodic job: create upcoming partitions and archive old ones."""
+    await ensure_message_partitions()
+    await archive_old_partitions()
@@ -0,0 +1,65 @@
+import asyncio
+import os
+from typing import List
+
+from app.schemas import SessionResponse
+from app.services.cache import TTLCache
+from app.services.couple_service import get_couple_context
+from app.services.log_utils import log_message
+from app.services.memory_service import (
+    MEMORY_PREFETCH_TTL,
+    MEMORY_SEARCH_BACKEND,
+    get_individual_agent,
+    prefetch_memory_space,
+)
+from app.services.summary_service import get_session_summary
+
+# Warm everything the first `send_message` of a session reads (couple context,
+# session summary, memory space snapshots) when the session is opened.
+SESSION_PREFETCH_ENABLED = os.getenv("SESSION_PREFETCH_ENABLED", "true").lower() == "true"
+
+# `/sessions/get-session` is polled; prefetch a (session, user) pair at most
+# once per snapshot lifetime.
+_prefetched = TTLCache(ttl_seconds=MEMORY_PREFETCH_TTL)
+
+
+async def _agents_for_session(session: SessionResponse, user_id: int) -> List[str]:
+    """Memory spaces `send_message` will search for this user in this session."""
+    if session.couple_id is not None:
+        context = await get_couple_context(session.couple_id)
+        if not context:
+            return []
+        agents = [context.agents["shared"]]
+        partner = context.partners.get(user_id)
+        if partner:
+            agents.append(context.agents[partner])
+        return agents
+    if session.session_mode == "solo":
+        return [get_individual_agent(user_id)]
+    return []
+
+
+async def prefetch_session_context(session: SessionResponse, user_id: int):
+    """Background task: warm the caches used by the next message of `session`."""
+    key = (session.id, user_id)
+    if key in _prefetched:
+        return
+    _prefetched.set(key, True)
+
+    try:
+        agents = await _agents_for_session(session, user_id)
+        tasks = [get_session_summary(session.id)]
+        if MEMORY_SEARCH_BACKEND != "postgres":
+            tasks += [prefetch_memory_space(agent_id) for agent_id in agents]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        failures = [r for r in results if isinstance(r, Exception)]
+        for failure in failures:
+            log_message("ERROR", f"Prefetch for session {session.id} failed: {failure!r}")
+        if failures:
+            # Let the next open retry
+            _prefetched.invalidate(key)
+            return
+        log_message("ASYNC", f"✅ Prefetched session {session.id} for user {user_id} ({', '.join(agents) or 'no memory spaces'})")
+    except Exception as e:
+        _prefetched.invalidate(key)
+        log_message("ERROR", f"Prefetch for session {session.id} failed: {e!r}")
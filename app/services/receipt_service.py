@@ -0,0 +1,129 @@
+import asyncio
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.database import get_write_db
+from app.services.log_utils import log_message
+
+# Receipts are buffered for RECEIPT_COALESCE_SECONDS and then applied in one
+# statement for every session and reader, so a busy session costs one UPDATE
+# per window instead of one per message. 0 applies each receipt immediately.
+RECEIPT_COALESCE_SECONDS = float(os.getenv("RECEIPT_COALESCE_SECONDS", "0.5"))
+
+# Status only ever moves forward: sent -> delivered -> read
+RECEIPT_LEVELS = {"delivered": 1, "read": 2}
+
+# Each receipt row marks the messages of a session in (from_id, up_to_id] that
+# the reader didn't write themselves. Overlapping rows are resolved to the
+# highest status per message before updating, and the partial
+# idx_messages_session_unread index keeps already-read history out of the scan.
+APPLY_RECEIPTS_SQL = """
+WITH receipt AS (
+    SELECT * FROM unnest($1::int[], $2::int[], $3::int[], $4::int[], $5::int[])
+        AS r("session_id", "reader_id", "from_id", "up_to_id", "level")
+), target AS (
+    SELECT m."id", MAX(r."level") AS "level"
+    FROM receipt r
+    JOIN "messages" m
+      ON m."session_id" = r."session_id"
+     AND m."id" > r."from_id" AND m."id" <= r."up_to_id"
+     AND m."message_status" <> 'read'
+     AND NOT (m."sender_type" = 'human' AND m."user_id" = r."reader_id")
+    GROUP BY m."id"
+), updated AS (
+    UPDATE "messages" m
+    SET "message_status" = CASE WHEN t."level" = 2 THEN 'read' ELSE 'delivered' END,
+        "updated_at" = CURRENT_TIMESTAMP
+    FROM target t
+    WHERE m."id" = t."id" AND (t."level" = 2 OR m."message_status" = 'sent')
+    RETURNING 1
+)
+SELECT COUNT(*) AS "updated" FROM updated
+"""
+
+ReceiptKey = Tuple[int, int, int]  # (session_id, reader_id, level)
+
+
+class ReceiptBuffer:
+    """Coalesces receipts per (session, reader, status) until the next flush."""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._high_water: Dict[ReceiptKey, int] = {}
+        self._ids: Dict[ReceiptKey, Set[int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def add(
+        self,
+        session_id: int,
+        reader_id: int,
+        status: str,
+        up_to_id: Optional[int] = None,
+        message_ids: Optional[List[int]] = None,
+    ):
+        key = (session_id, reader_id, RECEIPT_LEVELS[status])
+        if up_to_id is not None:
+            self._high_water[key] = max(self._high_water.get(key, 0), up_to_id)
+        if message_ids:
+            self._ids.setdefault(key, set()).update(message_ids)
+
+        if self.window_seconds <= 0:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window_seconds)
+        self._flush_task = None
+        await self.flush()
+
+    def _drain(self) -> List[Tuple[int, int, int, int, int]]:
+        """Pending receipts as (session_id, reader_id, from_id, up_to_id, level) rows."""
+        rows = []
+        for key, up_to_id in self._high_water.items():
+            rows.append((key[0], key[1], 0, up_to_id, key[2]))
+        for key, ids in self._ids.items():
+            covered = self._high_water.get(key, 0)
+            rows.extend((key[0], key[1], i - 1, i, key[2]) for i in sorted(ids) if i > covered)
+        self._high_water, self._ids = {}, {}
+        return rows
+
+    async def close(self):
+        """Cancel the scheduled flush and apply what is pending now."""
+        task, self._flush_task = self._flush_task, None
+        if task:
+            task.cancel()
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Apply every pending receipt in one UPDATE; returns the rows updated."""
+        rows = self._drain()
+        if not rows:
+            return 0
+        columns = [list(column) for column in zip(*rows)]
+        try:
+            result = await get_write_db().execute_query_dict(APPLY_RECEIPTS_SQL, columns)
+        except Exception as e:
+            # Receipts are best effort; the client's next high-water mark covers these
+            log_message("ERROR", f"Failed to apply {len(rows)} receipts: {e!r}")
+            return 0
+        return result[0]["updated"]
+
+
+receipt_buffer = ReceiptBuffer(RECEIPT_COALESCE_SECONDS)
+
+
+async def record_receipt(
+    session_id: int,
+    reader_id: int,
+    status: str,
+    up_to_id: Optional[int] = None,
+    message_ids: Optional[List[int]] = None,
+):
+    """Queue a delivered/read receipt for messages of a session."""
+    await receipt_buffer.add(session_id, reader_id, status, up_to_id, message_ids)
+
+
+async def flush_receipts():
+    """Apply pending receipts now (e.g. on shutdown)."""
+    await receipt_buffer.close()
@@ -0,0 +1,56 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from app.monitoring.tracing import span
+from app.services.log_utils import log_message
+
+# Background jobs running inside the API process, keyed by name.
+_tasks: Dict[str, asyncio.Task] = {}
+
+
+async def _run_periodically(
+    name: str,
+    interval_seconds: float,
+    job: Callable[[], Awaitable[object]],
+    initial_delay: float,
+):
+    await asyncio.sleep(initial_delay)
+    while True:
+        try:
+            # Each run is the root of its own trace
+            with span(f"job {name}"):
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # A failed run must not kill the loop; the next run retries
+            log_message("ERROR", f"Background job {name} failed: {e!r}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_periodic_task(
+    name: str,
+    interval_seconds: float,
+    job: Callable[[], Awaitable[object]],
+    initial_delay: float = 0,
+):
+    """Run `job` every `interval_seconds` until `stop_periodic_tasks()`.
+
+    Runs are sequential: the interval is measured from the end of a run, so a
+    slow run is never overlapped by the next one.
+    """
+    if name in _tasks and not _tasks[name].done():
+        return
+    log_message("INFO", f"Starting background job {name} (every {interval_seconds:g}s)")
+    _tasks[name] = asyncio.create_task(
+        _run_periodically(name, interval_seconds, job, initial_delay), name=name
+    )
+
+
+async def stop_periodic_tasks():
+    """Cancel every background job and wait for them to finish."""
+    tasks = list(_tasks.values())
+    _tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
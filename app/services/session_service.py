@@ -1,8 +1,11 @@
 from fastapi import HTTPException, status
 from typing import Optional, List
+from tortoise.exceptions import IntegrityError
+from datetime import datetime, timedelta, timezone
+import os
 
+from app.database import get_read_db, get_write_db
 from app.models.session import Session
-from app.models.session_participant import SessionParticipant
 from app.models.user import User
 from app.schemas import (
     SessionCreateSolo,
@@ -11,23 +14,236 @@ from app.schemas import (
     SessionParticipantResponse,
     SessionWithParticipants
 )
+from app.services.cache import TTLCache, MISSING
+from app.services.etag import make_etag
+from app.services.log_utils import log_message
 
-async def get_active_session_for_user(user: User) -> Optional[SessionWithParticipants]:
-    """Get the active session for a user if it exists."""
-    participant = await SessionParticipant.filter(user_id=user.id, is_active=True).first()
-    if not participant:
+# Per-user active session cache. `/sessions/get-session` is polled by clients,
+# so a hit here saves the DB round-trip. Entries are dropped on create, join and
+# leave; the short TTL bounds staleness across workers.
+ACTIVE_SESSION_CACHE_TTL = float(os.getenv("ACTIVE_SESSION_CACHE_TTL", "5"))
+_active_session_cache = TTLCache(ttl_seconds=ACTIVE_SESSION_CACHE_TTL)
+
+# Users whose session membership just changed read from the primary for a
+# short window, so the replica's lag can't hand them (and the cache) a stale
+# view of their own write.
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+_primary_pinned = TTLCache(ttl_seconds=REPLICA_STICKY_SECONDS)
+
+# Sessions without activity (messages, joins, leaves) for SESSION_IDLE_TTL
+# seconds are completed by a background sweep, which frees their participants
+# to start new sessions and keeps the active rows the lookups above scan small.
+# Safe to run on every worker: batches skip rows another sweep has locked.
+SESSION_EXPIRY_ENABLED = os.getenv("SESSION_EXPIRY_ENABLED", "true").lower() == "true"
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "21600"))
+SESSION_EXPIRY_INTERVAL = float(os.getenv("SESSION_EXPIRY_INTERVAL", "300"))
+SESSION_EXPIRY_BATCH_SIZE = int(os.getenv("SESSION_EXPIRY_BATCH_SIZE", "500"))
+# Message writes bump sessions.updated_at at most this often per session
+SESSION_TOUCH_INTERVAL = float(os.getenv("SESSION_TOUCH_INTERVAL", "60"))
+
+# One round-trip: the user's active participant row, its session and every
+# active participant of that session.
+ACTIVE_SESSION_SQL = """
+SELECT
+    s."id", s."session_code", s."creator_user_id", s."session_mode", s."couple_id",
+    s."status", s."max_participants", s."current_participants",
+    s."created_at", s."updated_at",
+    p."id" AS "participant_id", p."user_id" AS "participant_user_id",
+    p."role" AS "participant_role", p."joined_at" AS "participant_joined_at"
+FROM "session_participants" me
+JOIN "sessions" s ON s."id" = me."session_id"
+JOIN "session_participants" p ON p."session_id" = s."id" AND p."is_active"
+WHERE me."user_id" = $1 AND me."is_active"
+ORDER BY me."joined_at", p."joined_at"
+"""
+
+def _session_from_rows(rows: List[dict]) -> Optional[SessionWithParticipants]:
+    """Build a SessionWithParticipants from the rows of ACTIVE_SESSION_SQL."""
+    if not rows:
         return None
+    session_id = rows[0]["id"]
+    participants = [
+        SessionParticipantResponse(
+            id=row["participant_id"],
+            session_id=session_id,
+            user_id=row["participant_user_id"],
+            role=row["participant_role"],
+            joined_at=row["participant_joined_at"],
+            is_active=True,
+        )
+        for row in rows
+        if row["id"] == session_id
+    ]
+    first = rows[0]
+    return SessionWithParticipants(
+        id=session_id,
+        session_code=first["session_code"],
+        creator_user_id=first["creator_user_id"],
+        session_mode=first["session_mode"],
+        couple_id=first["couple_id"],
+        status=first["status"],
+        max_participants=first["max_participants"],
+        current_participants=first["current_participants"],
+        created_at=first["created_at"],
+        updated_at=first["updated_at"],
+        participants=participants,
+    )
+
+def invalidate_active_session_cache(*user_ids: int, session_id: Optional[int] = None):
+    """Drop cached active sessions for the given users and, optionally, every
+    cached member of `session_id` (whose participant list has changed).
+
+    Affected users are also pinned to the primary for REPLICA_STICKY_SECONDS.
+    """
+    affected = set(user_ids)
+    if session_id is not None:
+        affected.update(_active_session_cache.keys_where(
+            lambda _, cached: cached is not None and cached.id == session_id
+        ))
+    _active_session_cache.invalidate(*affected)
+    for user_id in affected:
+        _primary_pinned.set(user_id, True)
+
+async def get_active_session_for_user(
+    user: User,
+    use_cache: bool = True,
+) -> Optional[SessionWithParticipants]:
+    """Get the active session for a user if it exists."""
+    return await get_active_session_for_user_id(user.id, use_cache)
+
+async def get_active_session_for_user_id(
+    user_id: int,
+    use_cache: bool = True,
+) -> Optional[SessionWithParticipants]:
+    """Get the active session for a user id if it exists."""
+    if use_cache:
+        cached = _active_session_cache.get(user_id)
+        if cached is not MISSING:
+            return cached
 
-    session = await Session.get(id=participant.session_id)
-    participants_qs = await SessionParticipant.filter(session_id=session.id, is_active=True)
-    participants = [SessionParticipantResponse.from_orm(p) for p in participants_qs]
+    # Create/join guards and users with a fresh write read from the primary
+    db = get_read_db() if use_cache and user_id not in _primary_pinned else get_write_db()
+    rows = await db.execute_query_dict(ACTIVE_SESSION_SQL, [user_id])
+    session = _session_from_rows(rows)
+    _active_session_cache.set(user_id, session)
+    return session
+
+def session_etag(session: SessionWithParticipants) -> str:
+    """ETag of a session as returned by get-session, participants included."""
+    return make_etag(
+        session.id, session.status, session.current_participants, session.updated_at,
+        [(p.id, p.user_id, p.role, p.joined_at) for p in session.participants],
+    )
+
+async def check_user_active_session(user: User) -> Optional[SessionWithParticipants]:
+    """Check if user has an active session.
 
-    session_resp = SessionResponse.from_orm(session)
-    return SessionWithParticipants(**session_resp.model_dump(), participants=participants)
+    Always reads through to the database since it guards create and join.
+    """
+    return await get_active_session_for_user(user, use_cache=False)
 
-async def check_user_active_session(user: User) -> Optional[SessionParticipant]:
-    """Check if user has an active session."""
-    return await SessionParticipant.filter(user_id=user.id, is_active=True).first()
+# One active participation per user is enforced by this unique partial index
+# (migration 9). The NOT EXISTS guards below answer the common case without
+# an error, but two concurrent creates/joins of one user can both pass them
+# under READ COMMITTED; the index then rejects the second insert.
+ACTIVE_PARTICIPANT_INDEX = "uq_session_par_user_active"
+
+def _violates(error: IntegrityError, constraint: str) -> bool:
+    # Tortoise wraps the asyncpg error, which names the violated constraint
+    return getattr(error.args[0] if error.args else None, "constraint_name", None) == constraint
+
+# Create the session and register its creator in one statement.
+CREATE_SESSION_SQL = """
+WITH new_session AS (
+    INSERT INTO "sessions" (
+        "session_code", "creator_user_id", "session_mode", "couple_id",
+        "current_participants", "max_participants", "status"
+    )
+    SELECT $1, $2, $3, NULL, 1, $4, 'active'
+    WHERE NOT EXISTS (
+        SELECT 1 FROM "session_participants" WHERE "user_id" = $2 AND "is_active"
+    )
+    RETURNING *
+), creator AS (
+    INSERT INTO "session_participants" ("session_id", "user_id", "role", "is_active")
+    SELECT "id", $2, 'creator', TRUE FROM new_session
+    RETURNING "id", "user_id", "role", "joined_at"
+)
+SELECT
+    s.*,
+    c."id" AS "participant_id", c."user_id" AS "participant_user_id",
+    c."role" AS "participant_role", c."joined_at" AS "participant_joined_at"
+FROM new_session s, creator c
+"""
+
+# Claim a seat and insert the participant in one statement. Concurrent joins
+# serialize on the session row lock and Postgres re-checks the capacity
+# predicate against the updated row, so a session can never be overfilled.
+JOIN_SESSION_SQL = """
+WITH seat AS (
+    UPDATE "sessions"
+    SET "current_participants" = "current_participants" + 1,
+        "updated_at" = CURRENT_TIMESTAMP
+    WHERE "session_code" = $1
+      AND "status" = 'active'
+      AND "current_participants" < "max_participants"
+      AND NOT EXISTS (
+          SELECT 1 FROM "session_participants" WHERE "user_id" = $2 AND "is_active"
+      )
+    RETURNING *
+), joined AS (
+    INSERT INTO "session_participants" ("session_id", "user_id", "role", "is_active")
+    SELECT "id", $2, 'participant', TRUE FROM seat
+    ON CONFLICT ("session_id", "user_id") DO UPDATE
+    SET "is_active" = TRUE, "role" = EXCLUDED."role", "joined_at" = CURRENT_TIMESTAMP
+    RETURNING "session_id"
+)
+SELECT seat.* FROM seat JOIN joined ON joined."session_id" = seat."id"
+"""
+
+# Deactivate the user's participation and release the seat in one statement.
+LEAVE_SESSION_SQL = """
+WITH left_session AS (
+    UPDATE "session_participants"
+    SET "is_active" = FALSE
+    WHERE "user_id" = $1 AND "is_active"
+    RETURNING "session_id"
+)
+UPDATE "sessions"
+SET "current_participants" = GREATEST("current_participants" - 1, 0),
+    "updated_at" = CURRENT_TIMESTAMP
+WHERE "id" IN (SELECT "session_id" FROM left_session)
+RETURNING *
+"""
+
+# Complete one batch of idle sessions and deactivate their participants. The
+# oldest idle sessions come off idx_sessions_active_updated; their active
+# participants off idx_session_par_session_active.
+EXPIRE_IDLE_SESSIONS_SQL = """
+WITH idle AS (
+    SELECT "id" FROM "sessions"
+    WHERE "status" = 'active' AND "updated_at" < $1
+    ORDER BY "updated_at"
+    LIMIT $2
+    FOR UPDATE SKIP LOCKED
+), completed AS (
+    UPDATE "sessions" s
+    SET "status" = 'completed', "current_participants" = 0, "updated_at" = CURRENT_TIMESTAMP
+    FROM idle
+    WHERE s."id" = idle."id"
+    RETURNING s."id"
+), released AS (
+    UPDATE "session_participants" p
+    SET "is_active" = FALSE
+    FROM completed
+    WHERE p."session_id" = completed."id" AND p."is_active"
+    RETURNING p."session_id", p."user_id"
+)
+SELECT completed."id" AS "session_id", released."user_id"
+FROM completed LEFT JOIN released ON released."session_id" = completed."id"
+"""
+
+SESSION_CODE_ATTEMPTS = 3
 
 async def create_new_session(
     session_data: SessionCreateSolo | SessionCreateCouple,
@@ -39,52 +255,113 @@ async def create_new_session(
     session_mode = session_data.session_mode
     max_participants = 2
 
-    session = await Session.create(
-        session_code=Session.generate_session_code(),
-        creator_user_id=creator.id, 
-        session_mode=session_mode,
-        couple_id=None,  # Filled later for couple sessions if needed
-        max_participants=max_participants,
-        current_participants=1,
-    )
+    db = get_write_db()
+    for attempt in range(SESSION_CODE_ATTEMPTS):
+        try:
+            rows = await db.execute_query_dict(
+                CREATE_SESSION_SQL,
+                [Session.generate_session_code(), creator.id, session_mode, max_participants],
+            )
+            break
+        except IntegrityError as e:
+            if _violates(e, ACTIVE_PARTICIPANT_INDEX):
+                # A concurrent create or join of the same user got there first
+                rows = []
+                break
+            # Session code collision, retry with a fresh code
+            if attempt == SESSION_CODE_ATTEMPTS - 1:
+                raise
 
-    # Register the creator as the first participant
-    await SessionParticipant.create(
-        session_id=session.id,
-        user_id=creator.id,
-        role="creator",
-    )
+    if not rows:
+        # The guard found an existing active session
+        ensure_user_not_in_session(await check_user_active_session(creator))
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not create session, please retry"
+        )
 
-    # Return full session details with participants
-    participants_qs = await SessionParticipant.filter(session_id=session.id, is_active=True)
-    participants = [SessionParticipantResponse.from_orm(p) for p in participants_qs]
-    
-    session_resp = SessionResponse.from_orm(session)
-    return SessionWithParticipants(**session_resp.model_dump(), participants=participants)
+    invalidate_active_session_cache(creator.id)
+    return _session_from_rows(rows)
 
 async def get_session_by_code(session_code: str) -> Optional[Session]:
     """Get a session by its unique code."""
     return await Session.filter(session_code=session_code).first()
 
-async def add_participant_to_session(
-    session: Session,
-    user: User,
-) -> Session:
-    """Add a user as participant to a session."""
-    
-    # Add user as participant
-    await SessionParticipant.create(
-        session_id=session.id,
-        user_id=user.id,
-        role="participant",
-    )
+async def get_sessions_by_codes(session_codes: List[str]) -> dict[str, Optional[Session]]:
+    """Resolve many sessions by code in a single IN query, None where missing."""
+    sessions = await Session.filter(session_code__in=session_codes).using_db(get_read_db())
+    by_code = {s.session_code: s for s in sessions}
+    return {code: by_code.get(code) for code in session_codes}
 
-    # Increment participant count safely
-    session.current_participants += 1
-    await session.save(update_fields=["current_participants"])
+async def join_session_by_code(session_code: str, user: User) -> SessionResponse:
+    """Atomically claim a seat in a session and add the user as participant."""
+    try:
+        rows = await get_write_db().execute_query_dict(
+            JOIN_SESSION_SQL, [session_code, user.id]
+        )
+    except IntegrityError as e:
+        if not _violates(e, ACTIVE_PARTICIPANT_INDEX):
+            raise
+        # A concurrent create or join of the same user got there first
+        rows = []
+    if not rows:
+        # Only the failure path pays for a second query, to explain the 4xx
+        session = ensure_session_exists(await get_session_by_code(session_code))
+        ensure_session_is_active(session)
+        ensure_session_has_capacity(session)
+        ensure_user_not_in_session(await check_user_active_session(user))
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Could not join session, please retry"
+        )
+
+    session = SessionResponse.model_validate(rows[0])
+    invalidate_active_session_cache(user.id, session_id=session.id)
+    return session
 
+async def remove_participant_from_session(user: User) -> Optional[SessionResponse]:
+    """Deactivate the user's active participation and free up their seat."""
+    rows = await get_write_db().execute_query_dict(LEAVE_SESSION_SQL, [user.id])
+    if not rows:
+        return None
+
+    session = SessionResponse.model_validate(rows[0])
+    invalidate_active_session_cache(user.id, session_id=session.id)
     return session
 
+async def touch_session(session_id: int):
+    """Record activity on a session so the idle sweep leaves it alone."""
+    now = datetime.now(timezone.utc)
+    await Session.filter(
+        id=session_id, updated_at__lt=now - timedelta(seconds=SESSION_TOUCH_INTERVAL)
+    ).using_db(get_write_db()).update(updated_at=now)
+
+async def expire_idle_sessions(
+    idle_seconds: float = SESSION_IDLE_TTL,
+    batch_size: int = SESSION_EXPIRY_BATCH_SIZE,
+) -> int:
+    """Complete sessions idle for `idle_seconds`, a batch at a time.
+
+    Returns the number of sessions completed.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=idle_seconds)
+    expired = 0
+    while True:
+        rows = await get_write_db().execute_query_dict(EXPIRE_IDLE_SESSIONS_SQL, [cutoff, batch_size])
+        users_by_session: dict[int, list[int]] = {}
+        for row in rows:
+            users = users_by_session.setdefault(row["session_id"], [])
+            if row["user_id"] is not None:
+                users.append(row["user_id"])
+        for session_id, user_ids in users_by_session.items():
+            invalidate_active_session_cache(*user_ids, session_id=session_id)
+        expired += len(users_by_session)
+        if len(users_by_session) < batch_size:
+            break
+    if expired:
+        log_message("SESSION", f"Completed {expired} sessions idle for over {idle_seconds:g}s")
+    return expired
+
 # Error checking functions
 def ensure_session_exists(session: Optional[Session]) -> Session:
     """Ensure a session exists or raise 404."""
@@ -95,6 +372,14 @@ def ensure_session_exists(session: Optional[Session]) -> Session:
         )
     return session
 
+def ensure_session_is_active(session: Session):
+    """Ensure session is still accepting participants."""
+    if session.status != "active":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Session is not active"
+        )
+
 def ensure_session_has_capacity(session: Session):
     """Ensure session isn't full."""
     if session.current_participants >= session.max_participants:
@@ -103,9 +388,9 @@ def ensure_session_has_capacity(session: Session):
             detail="Session is full"
         )
 
-def ensure_user_not_in_session(participant: Optional[SessionParticipant]):
+def ensure_user_not_in_session(active_session: Optional[SessionWithParticipants]):
     """Ensure user isn't already in a session."""
-    if participant:
+    if active_session:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User already has an active session"
@@ -0,0 +1,123 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.database import get_read_db, get_write_db
+from app.models.message import Message
+from app.models.session import Session
+from app.services.cache import TTLCache, MISSING
+from app.services.couple_service import get_couple_context
+from app.services.llm_service import complete
+from app.services.log_utils import log_message
+
+# Rolling per-session summary: refreshed in the background once
+# SESSION_SUMMARY_EVERY_TURNS new user messages have arrived since the last
+# refresh, and always kept under SESSION_SUMMARY_MAX_WORDS so the prompt block
+# stays the same size however long the session runs.
+SESSION_SUMMARY_EVERY_TURNS = int(os.getenv("SESSION_SUMMARY_EVERY_TURNS", "5"))
+SESSION_SUMMARY_MAX_WORDS = int(os.getenv("SESSION_SUMMARY_MAX_WORDS", "200"))
+# Upper bound on the new messages folded into one refresh
+SESSION_SUMMARY_MAX_MESSAGES = int(os.getenv("SESSION_SUMMARY_MAX_MESSAGES", "60"))
+
+# Summaries only change every few turns; other workers pick up a refresh
+# within the TTL.
+SESSION_SUMMARY_CACHE_TTL = float(os.getenv("SESSION_SUMMARY_CACHE_TTL", "60"))
+_summary_cache = TTLCache(ttl_seconds=SESSION_SUMMARY_CACHE_TTL)
+
+# The current summary and how many user messages it doesn't cover yet
+PENDING_TURNS_SQL = """
+SELECT s."summary", s."summary_message_id", s."couple_id", COUNT(m."id") AS "pending"
+FROM "sessions" s
+LEFT JOIN "messages" m
+    ON m."session_id" = s."id"
+   AND m."sender_type" = 'human'
+   AND m."id" > COALESCE(s."summary_message_id", 0)
+WHERE s."id" = $1
+GROUP BY s."id"
+"""
+
+SUMMARY_PROMPT = """You keep a running summary of a therapy conversation for the therapist.
+Update the summary with the new messages. Keep who said what, feelings, topics, decisions and
+open questions; drop small talk. Write plain prose in under {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{transcript}
+
+Updated summary:
+"""
+
+
+def _clip(text: str) -> str:
+    """Hard cap on the summary size, whatever the model returned."""
+    words = text.split()
+    if len(words) <= SESSION_SUMMARY_MAX_WORDS:
+        return text.strip()
+    return " ".join(words[:SESSION_SUMMARY_MAX_WORDS]) + " ..."
+
+
+async def get_session_summary(session_id: int) -> Optional[str]:
+    """Get the rolling summary of a session, from cache when possible."""
+    cached = _summary_cache.get(session_id)
+    if cached is not MISSING:
+        return cached
+
+    summary = await Session.filter(id=session_id).using_db(get_read_db()).first().values_list(
+        "summary", flat=True
+    )
+    _summary_cache.set(session_id, summary)
+    return summary
+
+
+async def update_session_summary(session_id: int, force: bool = False) -> bool:
+    """Fold the messages since the last refresh into the session summary.
+
+    Does nothing until SESSION_SUMMARY_EVERY_TURNS user messages are pending
+    (unless `force`). Returns whether the summary changed.
+    """
+    db = get_write_db()
+    rows = await db.execute_query_dict(PENDING_TURNS_SQL, [session_id])
+    if not rows:
+        return False
+    state = rows[0]
+    if state["pending"] == 0 or (state["pending"] < SESSION_SUMMARY_EVERY_TURNS and not force):
+        return False
+
+    watermark = state["summary_message_id"]
+    query = Message.filter(session_id=session_id)
+    if watermark is not None:
+        query = query.filter(id__gt=watermark)
+    messages = await query.using_db(db).order_by("id").limit(SESSION_SUMMARY_MAX_MESSAGES)
+
+    speakers = {}
+    if state["couple_id"] is not None:
+        context = await get_couple_context(state["couple_id"])
+        if context:
+            speakers = {uid: context.names[letter] for uid, letter in context.partners.items()}
+    transcript = "\n".join(
+        f"{'Therapist' if m.sender_type == 'ai' else speakers.get(m.user_id, 'User')}: {m.content}"
+        for m in messages
+    )
+
+    prompt = SUMMARY_PROMPT.format(
+        max_words=SESSION_SUMMARY_MAX_WORDS,
+        summary=state["summary"] or "(none yet)",
+        transcript=transcript,
+    )
+    summary = _clip(await asyncio.to_thread(complete, prompt, 600))
+
+    # Only apply on top of the summary we started from; a concurrent refresh
+    # that got there first wins and this one is dropped
+    guard = {"summary_message_id": watermark} if watermark is not None else {"summary_message_id__isnull": True}
+    updated = await Session.filter(id=session_id, **guard).using_db(db).update(
+        summary=summary,
+        summary_message_id=messages[-1].id,
+        summary_updated_at=datetime.now(timezone.utc),
+    )
+    if updated:
+        _summary_cache.set(session_id, summary)
+        log_message("ASYNC", f"✅ Session {session_id} summary updated ({len(messages)} messages folded in)")
+    return bool(updated)
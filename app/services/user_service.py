@@ -1,35 +1,94 @@
 from fastapi import HTTPException, status
 from typing import Optional, List
-from tortoise.exceptions import DoesNotExist
+from tortoise.expressions import Q
+from tortoise.transactions import in_transaction
 
+from app.database import get_read_db, get_write_db
 from app.models.user import User
 from app.schemas import UserResponse, UserUpdate
+from app.services.couple_service import invalidate_couple_contexts_for_user
+from app.services.email_filter import email_may_exist, remember_email
+from app.services.etag import make_etag
+from app.services.pagination import encode_cursor, decode_cursor
 
-async def get_paginated_users(skip: int = 0, limit: int = 10) -> List[User]:
-    """Get a paginated list of users."""
-    return await User.all().offset(skip).limit(limit)
+# Pure reads go to the read replica (when configured). Callers that go on to
+# modify the returned row pass `primary=True` so they never act on a stale copy.
 
-async def get_user_by_id(user_id: int) -> Optional[User]:
+async def get_paginated_users(
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> tuple[List[User], Optional[str]]:
+    """Get a page of users, newest first, and the cursor of the next page.
+
+    Keyset pagination on (created_at, id): each page is an index range scan
+    starting at the cursor, so deep pages cost the same as the first one and
+    rows inserted meanwhile don't shift later pages.
+    """
+    query = User.all().using_db(get_read_db())
+    if cursor:
+        created_at, user_id = decode_cursor(cursor)
+        # The created_at bound lets Postgres seek straight to the cursor;
+        # the OR only breaks ties between rows sharing a timestamp
+        query = query.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lt=user_id)
+        )
+    users = await query.order_by("-created_at", "-id").limit(limit + 1)
+
+    next_cursor = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].created_at, users[-1].id)
+    return users, next_cursor
+
+async def get_user_by_id(user_id: int, primary: bool = False) -> Optional[User]:
     """Get a user by their ID."""
-    return await User.get_or_none(id=user_id)
+    db = get_write_db() if primary else get_read_db()
+    return await User.filter(id=user_id).using_db(db).first()
 
 async def get_user_by_email(email: str, active_only: bool = True) -> Optional[User]:
     """Get a user by their email address."""
     query = User.filter(email=email)
     if active_only:
         query = query.filter(is_active=True)
-    return await query.first()
+    return await query.using_db(get_read_db()).first()
 
 async def get_user_by_username(username: str, active_only: bool = True) -> Optional[User]:
     """Get a user by their username."""
     query = User.filter(username=username)
     if active_only:
         query = query.filter(is_active=True)
-    return await query.first()
+    return await query.using_db(get_read_db()).first()
+
+async def get_users_batch(
+    ids: List[int],
+    emails: List[str],
+) -> tuple[dict[int, Optional[User]], dict[str, Optional[User]]]:
+    """Resolve users by id and by email in a single IN query.
+
+    Returns one dict per key type, keyed by the requested values, with None
+    for keys that matched nothing. Emails follow `get_user_by_email` and only
+    match active users.
+    """
+    users: List[User] = []
+    if ids or emails:
+        condition = Q(id__in=ids) if ids else Q(email__in=emails, is_active=True)
+        if ids and emails:
+            condition = condition | Q(email__in=emails, is_active=True)
+        users = await User.filter(condition).using_db(get_read_db())
+
+    users_by_id = {u.id: u for u in users}
+    users_by_email = {u.email: u for u in users if u.is_active}
+    return (
+        {user_id: users_by_id.get(user_id) for user_id in ids},
+        {email: users_by_email.get(email) for email in emails},
+    )
 
 async def check_email_exists(email: str) -> bool:
     """Check if a user with the given email exists."""
-    return await User.filter(email=email).exists()
+    # Emails the filter has never seen are answered without a query
+    if not email_may_exist(email):
+        return False
+    return await User.filter(email=email).using_db(get_read_db()).exists()
 
 async def check_username_exists(username: str) -> bool:
     """Check if a user with the given username exists."""
@@ -58,6 +117,10 @@ async def update_user_profile(user: User, update_data: UserUpdate) -> User:
     # Update user with provided fields
     await user.update_from_dict(update_data.dict(exclude_unset=True))
     await user.save()
+    if "email" in update_data.dict(exclude_unset=True):
+        remember_email(user.email)
+    # Names are part of the cached couple context
+    invalidate_couple_contexts_for_user(user.id)
     return user
 
 async def deactivate_user(user: User) -> User:
@@ -66,55 +129,81 @@ async def deactivate_user(user: User) -> User:
     await user.save()
     return user
 
+# Both rows are updated by one statement. The WHERE clause refuses to steal
+# a partner who is already linked to someone else; in that case fewer than two
+# rows match and the transaction is rolled back.
+LINK_PARTNERS_SQL = """
+UPDATE "users"
+SET "partner_id" = CASE "id" WHEN $1 THEN $2 ELSE $1 END,
+    "updated_at" = CURRENT_TIMESTAMP
+WHERE "id" IN ($1, $2)
+  AND "is_active"
+  AND ("partner_id" IS NULL OR "partner_id" IN ($1, $2))
+RETURNING "id", "partner_id", "updated_at"
+"""
+
+# Clears the user's link and, if it still points back, the partner's.
+UNLINK_PARTNERS_SQL = """
+UPDATE "users"
+SET "partner_id" = NULL,
+    "updated_at" = CURRENT_TIMESTAMP
+WHERE ("id" = $1 AND "partner_id" = $2)
+   OR ("id" = $2 AND "partner_id" = $1)
+RETURNING "id", "updated_at"
+"""
+
 async def link_users_as_partners(user: User, partner: User) -> tuple[User, User]:
-    """Link two users as partners."""
+    """Link two users as partners in a single transactional UPDATE."""
     if user.id == partner.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot link user to themselves"
         )
     
-    # Link both users
-    user.partner_id = partner.id
-    user.relationship_status = "in_relationship"
-    await user.save()
-    
-    partner.partner_id = user.id
-    partner.relationship_status = "in_relationship"
-    await partner.save()
-    
+    async with in_transaction("default") as conn:
+        rows = await conn.execute_query_dict(LINK_PARTNERS_SQL, [user.id, partner.id])
+        if len(rows) != 2:
+            # Raising inside the block rolls back a half-applied link
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="User or partner is already linked to someone else"
+            )
+
+    # Mirror the committed values onto the in-memory rows
+    for obj in (user, partner):
+        row = next(r for r in rows if r["id"] == obj.id)
+        obj.partner_id = row["partner_id"]
+        obj.updated_at = row["updated_at"]
     return user, partner
 
-async def unlink_partners(user: User) -> tuple[User, Optional[User]]:
-    """Unlink a user from their partner."""
+async def unlink_partners(user: User) -> tuple[User, Optional[int]]:
+    """Unlink a user from their partner in a single UPDATE.
+
+    Returns the user and the id of the former partner, or None if the
+    partner's row no longer pointed back at the user.
+    """
     if not user.partner_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="User has no linked partner"
         )
     
-    try:
-        # Get and unlink partner
-        partner = await User.get(id=user.partner_id)
-        partner.partner_id = None
-        partner.relationship_status = "single"
-        await partner.save()
-        
-        # Unlink user
-        user.partner_id = None
-        user.relationship_status = "single"
-        await user.save()
-        
-        return user, partner
-        
-    except DoesNotExist:
-        # Partner not found (shouldn't happen, but handle gracefully)
-        user.partner_id = None
-        user.relationship_status = "single"
-        await user.save()
-        return user, None
+    partner_id = user.partner_id
+    async with in_transaction("default") as conn:
+        rows = await conn.execute_query_dict(UNLINK_PARTNERS_SQL, [user.id, partner_id])
+
+    updated = {row["id"]: row for row in rows}
+    if user.id in updated:
+        user.updated_at = updated[user.id]["updated_at"]
+    user.partner_id = None
+    return user, partner_id if partner_id in updated else None
 
 # Validation functions
+def user_etag(user: User) -> str:
+    """ETag of a user's details. Profile, partner and status changes all bump
+    updated_at; last_login is saved on its own so it is part of the tag."""
+    return make_etag(user.id, user.updated_at, user.last_login)
+
 def ensure_user_exists(user: Optional[User]) -> User:
     """Ensure a user exists or raise 404."""
     if not user:
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for response serialization.
+
+Compares the per-object and batched ways of building responses that the
+routers use, and the stdlib JSON renderer against orjson:
+
+- UserResponse with email as EmailStr (as it was) vs plain str
+- [UserResponse.from_orm(u) for u in users] vs UserResponseList.validate_python
+- SessionWithParticipants(**resp.model_dump(), ...) vs direct construction
+- JSONResponse (json.dumps) vs ORJSONResponse (orjson.dumps)
+
+Usage: python bench_serialization.py [--rows 100] [--repeat 200]
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import EmailStr
+
+from app.schemas import (
+    UserResponse,
+    UserResponseList,
+    SessionResponse,
+    SessionParticipantResponse,
+    SessionWithParticipants,
+)
+
+
+class EmailStrUserResponse(UserResponse):
+    """UserResponse as it was, re-validating every serialized email."""
+    email: EmailStr
+
+
+def make_users(rows: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i, email=f"user{i}@example.com", username=f"user{i}",
+            first_name="Test", last_name="User", phone_number=None,
+            date_of_birth=None, gender=None, is_active=True, is_verified=True,
+            partner_id=None, created_at=now, updated_at=now, last_login=None,
+        )
+        for i in range(rows)
+    ]
+
+
+def make_session() -> tuple:
+    now = datetime.now(timezone.utc)
+    session = SimpleNamespace(
+        id=1, session_code="ABCD1234", creator_user_id=1, session_mode="couple",
+        couple_id=None, status="active", max_participants=2,
+        current_participants=2, created_at=now, updated_at=now,
+    )
+    participants = [
+        SessionParticipantResponse(
+            id=i, session_id=1, user_id=i, role="participant", joined_at=now, is_active=True
+        )
+        for i in (1, 2)
+    ]
+    return session, participants
+
+
+def report(name: str, seconds: float, baseline: float | None = None):
+    line = f"  {name:<48} {seconds * 1e6:>10.1f} µs/op"
+    if baseline:
+        line += f"  ({baseline / seconds:.1f}x)"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=100, help="users per list response")
+    parser.add_argument("--repeat", type=int, default=200, help="iterations per case")
+    args = parser.parse_args()
+
+    def bench(fn) -> float:
+        return min(timeit.repeat(fn, number=args.repeat, repeat=5)) / args.repeat
+
+    users = make_users(args.rows)
+    print(f"📋 User list ({args.rows} rows)")
+    email_str = bench(lambda: [EmailStrUserResponse.from_orm(u) for u in users])
+    per_object = bench(lambda: [UserResponse.from_orm(u) for u in users])
+    batched = bench(lambda: UserResponseList.validate_python(users, from_attributes=True))
+    report("per-object from_orm (EmailStr)", email_str)
+    report("per-object from_orm (str email)", per_object, email_str)
+    report("TypeAdapter(list[UserResponse])", batched, email_str)
+
+    session, participants = make_session()
+    print("📋 Session with participants")
+    round_trip = bench(lambda: SessionWithParticipants(
+        **SessionResponse.from_orm(session).model_dump(), participants=participants
+    ))
+    direct = bench(lambda: SessionWithParticipants(
+        **vars(session), participants=participants
+    ))
+    report("model_dump + revalidate", round_trip)
+    report("direct construction", direct, round_trip)
+
+    content = jsonable_encoder(UserResponseList.validate_python(users, from_attributes=True))
+    print(f"📋 Rendering ({args.rows} users)")
+    stdlib = bench(lambda: JSONResponse(content))
+    fast = bench(lambda: ORJSONResponse(content))
+    report("JSONResponse (json.dumps)", stdlib)
+    report("ORJSONResponse (orjson.dumps)", fast, stdlib)
+
+
+if __name__ == "__main__":
+    main()
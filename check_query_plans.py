@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN-based check that the hot query paths are served by their indexes.
+
+Runs EXPLAIN for each query shape used by the services and verifies the
+expected index shows up in the plan. Sequential scans are disabled for the
+check, but run it against a database with representative data: on nearly
+empty tables the planner may still prefer a different index.
+
+Usage: python check_query_plans.py
+"""
+
+import asyncio
+import json
+import sys
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+from tortoise.transactions import in_transaction
+
+from app.database import TORTOISE_ORM
+from app.services.email_filter import UPDATED_EMAILS_SQL
+from app.services.memory_service import PostgresMessageSearch
+from app.services.receipt_service import APPLY_RECEIPTS_SQL
+from app.services.session_service import (
+    ACTIVE_SESSION_SQL,
+    EXPIRE_IDLE_SESSIONS_SQL,
+    JOIN_SESSION_SQL,
+)
+
+# (description, sql, params, indexes expected in the plan)
+QUERY_PLANS = [
+    (
+        "Active session lookup",
+        ACTIVE_SESSION_SQL,
+        [1],
+        ["uq_session_par_user_active", "idx_session_par_session_active"],
+    ),
+    (
+        "Join guard (user already in a session)",
+        JOIN_SESSION_SQL,
+        ["ABCD1234", 1],
+        ["uq_session_par_user_active"],
+    ),
+    (
+        "Session message history",
+        'SELECT * FROM "messages" WHERE "session_id" = $1 ORDER BY "created_at" LIMIT 50',
+        [1],
+        ["idx_messages_session_created"],
+    ),
+    (
+        "Full-text memory search (couple shared space)",
+        PostgresMessageSearch.SEARCH_SQL.format(scope='s."couple_id" = $2', limit=10),
+        ["anxious about the interview", 1],
+        ["idx_sessions_couple", "idx_messages_session_created"],
+    ),
+    (
+        "Full-text memory search (whole table)",
+        PostgresMessageSearch.SEARCH_SQL.format(scope="TRUE", limit=10),
+        ["anxious about the interview"],
+        ["idx_messages_search_vector"],
+    ),
+    (
+        "Coalesced message receipts",
+        APPLY_RECEIPTS_SQL,
+        [[1], [1], [0], [100], [2]],
+        ["idx_messages_session_unread"],
+    ),
+    (
+        "Idle session sweep",
+        EXPIRE_IDLE_SESSIONS_SQL,
+        [datetime.now(timezone.utc), 500],
+        ["idx_sessions_active_updated", "idx_session_par_session_active"],
+    ),
+    (
+        "Users keyset page",
+        'SELECT "id" FROM "users" WHERE "created_at" <= $1 '
+        'AND ("created_at" < $1 OR "id" < $2) '
+        'ORDER BY "created_at" DESC, "id" DESC LIMIT 11',
+        [datetime.now(timezone.utc), 1],
+        ["idx_users_created_id"],
+    ),
+    (
+        "Email filter refresh",
+        UPDATED_EMAILS_SQL,
+        [datetime.now(timezone.utc)],
+        ["idx_users_updated_at"],
+    ),
+    (
+        "Couples of a user",
+        'SELECT * FROM "couples" WHERE ("user1_id" = $1 OR "user2_id" = $1) AND "is_active"',
+        [1],
+        ["idx_couples_user1_active", "idx_couples_user2_active"],
+    ),
+]
+
+# Indexes of partitions ("messages" is partitioned by month) are named after
+# the partition; map them to the index they were created from on the parent
+PARTITION_INDEXES_SQL = """
+SELECT child."relname" AS "child", parent."relname" AS "parent"
+FROM "pg_inherits" i
+JOIN "pg_class" child ON child."oid" = i."inhrelid"
+JOIN "pg_class" parent ON parent."oid" = i."inhparent"
+WHERE child."relkind" = 'i'
+"""
+
+
+def collect_indexes(plan: dict) -> set:
+    """Collect every index name referenced anywhere in a JSON plan tree."""
+    found = set()
+    if "Index Name" in plan:
+        found.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        found |= collect_indexes(child)
+    return found
+
+
+async def check_plans() -> bool:
+    await Tortoise.init(config=TORTOISE_ORM)
+    ok = True
+    try:
+        rows = await Tortoise.get_connection("default").execute_query_dict(PARTITION_INDEXES_SQL)
+        parents = {row["child"]: row["parent"] for row in rows}
+        for description, sql, params, expected in QUERY_PLANS:
+            # EXPLAIN without ANALYZE never executes the data-modifying CTEs
+            async with in_transaction("default") as conn:
+                await conn.execute_script("SET LOCAL enable_seqscan = off")
+                rows = await conn.execute_query_dict(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = rows[0]["QUERY PLAN"]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            used = {parents.get(name, name) for name in collect_indexes(plan[0]["Plan"])}
+            missing = [name for name in expected if name not in used]
+            if missing:
+                ok = False
+                print(f"❌ {description}: missing {', '.join(missing)} (used: {', '.join(sorted(used)) or 'none'})")
+            else:
+                print(f"✅ {description}: {', '.join(expected)}")
+    finally:
+        await Tortoise.close_connections()
+    return ok
+
+
+if __name__ == "__main__":
+    print("🔍 Checking query plans for the hot paths...")
+    sys.exit(0 if asyncio.run(check_plans()) else 1)
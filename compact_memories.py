@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Run memory compaction once, outside the API's scheduled job.
+
+Deduplicates and summarizes the old memories of the given agent spaces, or of
+every space that received messages within MEMORY_COMPACTION_LOOKBACK.
+
+Usage: python compact_memories.py [--agent couple_1_shared ...] [--dry-run]
+"""
+
+import argparse
+import asyncio
+
+from tortoise import Tortoise
+
+from app.database import TORTOISE_ORM
+from app.services.compaction_service import compact_memories
+
+
+async def main(agent_ids, dry_run):
+    await Tortoise.init(config=TORTOISE_ORM)
+    try:
+        results = await compact_memories(agent_ids, dry_run=dry_run)
+    finally:
+        await Tortoise.close_connections()
+
+    if not results:
+        print("ℹ️ No memory spaces to compact")
+    for agent_id, stats in results.items():
+        print(
+            f"{'🔍' if dry_run else '✅'} {agent_id}: {stats['memories']} memories, "
+            f"{stats['duplicates_removed']} duplicates removed, "
+            f"{stats['memories_folded']} folded into {stats['summaries_added']} summaries"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agent", action="append", dest="agent_ids", help="agent space to compact (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="report what would change without writing")
+    args = parser.parse_args()
+    asyncio.run(main(args.agent_ids, args.dry_run))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Export conversation history as NDJSON, for research and compliance.
+
+Streams `messages` rows (one JSON object per line, oldest first) in chunked
+keyset reads, so memory use stays flat however large the export is.
+
+Usage: python export_messages.py [--session ID] [--couple ID] [--user ID]
+                                 [--since 2026-01-01] [--until 2026-02-01]
+                                 [--gzip] [-o messages.ndjson.gz]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+
+from app.database import TORTOISE_ORM
+from app.schemas import MessageExportFilter
+from app.services.export_service import iter_ndjson
+
+
+def utc_datetime(value: str) -> datetime:
+    """ISO date/time; without an offset it is taken as UTC."""
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+
+async def export(export_filter: MessageExportFilter, output, compress: bool):
+    await Tortoise.init(config=TORTOISE_ORM)
+    started = time.monotonic()
+    written = 0
+    try:
+        async for piece in iter_ndjson(export_filter, compress=compress):
+            output.write(piece)
+            written += len(piece)
+    finally:
+        await Tortoise.close_connections()
+    elapsed = time.monotonic() - started
+    print(f"✅ Exported {written / 1e6:.1f} MB in {elapsed:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--session", type=int, help="only this session")
+    parser.add_argument("--couple", type=int, help="only sessions of this couple")
+    parser.add_argument("--user", type=int, help="only messages of this user")
+    parser.add_argument("--since", type=utc_datetime, help="created at or after (ISO date/time)")
+    parser.add_argument("--until", type=utc_datetime, help="created before (ISO date/time)")
+    parser.add_argument("--gzip", action="store_true", help="gzip-compress the output")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    export_filter = MessageExportFilter(
+        session_id=args.session, couple_id=args.couple, user_id=args.user,
+        since=args.since, until=args.until,
+    )
+    if args.output:
+        with open(args.output, "wb") as output:
+            asyncio.run(export(export_filter, output, args.gzip))
+    else:
+        asyncio.run(export(export_filter, sys.stdout.buffer, args.gzip))
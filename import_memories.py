@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Bulk-import historical transcripts into the per-agent memory spaces.
+
+Reads an NDJSON file (optionally .gz) line by line, in the format written by
+export_messages.py: `content`, `user_id`, optional `couple_id` / `partner`, and
+`sender_type` or `role`. User messages go to couple_{id}_shared plus
+couple_{id}_{partner}, or to individual_{user_id}; assistant lines are skipped.
+
+Writes are batched and run with bounded concurrency (IMPORT_BATCH_SIZE,
+IMPORT_CONCURRENCY). Progress is checkpointed next to the input file, so
+re-running the same command after an interruption resumes where it stopped.
+
+Usage: python import_memories.py transcripts.ndjson[.gz] [--checkpoint PATH] [--restart]
+"""
+
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+
+from tortoise import Tortoise
+
+from app.database import TORTOISE_ORM
+from app.schemas import MemoryImportStatus
+from app.services.import_service import import_transcripts
+
+
+async def main(path, checkpoint_path):
+    await Tortoise.init(config=TORTOISE_ORM)
+    progress = MemoryImportStatus(job_id="cli", started_at=datetime.now(timezone.utc))
+    try:
+        await import_transcripts(path, progress, checkpoint_path=checkpoint_path)
+    finally:
+        await Tortoise.close_connections()
+
+    elapsed = (progress.finished_at - progress.started_at).total_seconds()
+    print(
+        f"✅ Imported {progress.memories_imported} memories from {progress.lines_read} lines "
+        f"({progress.skipped} skipped) in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="NDJSON transcript file, optionally gzipped")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f"{args.path}.checkpoint"
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    asyncio.run(main(args.path, checkpoint_path))
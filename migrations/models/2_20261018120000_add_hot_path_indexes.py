@@ -0,0 +1,43 @@
+from tortoise import BaseDBAsyncClient
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block, so aerich
+# must run this migration outside of one and each statement is sent on its own.
+RUN_IN_TRANSACTION = False
+
+UPGRADE_STATEMENTS = [
+    # Active session lookup and the one-active-session-per-user guard
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_session_par_user_active" '
+    'ON "session_participants" ("user_id") WHERE "is_active"',
+    # Active participants of a session, in join order
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_session_par_session_active" '
+    'ON "session_participants" ("session_id", "joined_at") WHERE "is_active"',
+    # Message history of a session, in chronological order
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_messages_session_created" '
+    'ON "messages" ("session_id", "created_at")',
+    # Active sessions by last activity
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_sessions_active_updated" '
+    'ON "sessions" ("updated_at") WHERE "status" = \'active\'',
+    # Couples a user belongs to, from either side
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_couples_user1_active" '
+    'ON "couples" ("user1_id") WHERE "is_active"',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_couples_user2_active" '
+    'ON "couples" ("user2_id") WHERE "is_active"',
+]
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    for statement in UPGRADE_STATEMENTS:
+        await db.execute_script(statement)
+    # aerich executes whatever we return; an empty script is rejected by asyncpg
+    return "SELECT 1;"
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # aerich always downgrades inside a transaction, so drop non-concurrently
+    return """
+        DROP INDEX IF EXISTS "idx_session_par_user_active";
+        DROP INDEX IF EXISTS "idx_session_par_session_active";
+        DROP INDEX IF EXISTS "idx_messages_session_created";
+        DROP INDEX IF EXISTS "idx_sessions_active_updated";
+        DROP INDEX IF EXISTS "idx_couples_user1_active";
+        DROP INDEX IF EXISTS "idx_couples_user2_active";"""
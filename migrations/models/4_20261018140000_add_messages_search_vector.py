@@ -0,0 +1,33 @@
+from tortoise import BaseDBAsyncClient
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+RUN_IN_TRANSACTION = False
+
+UPGRADE_STATEMENTS = [
+    # Adding a stored generated column rewrites "messages" under an exclusive
+    # lock; schedule this migration for a quiet window on large tables.
+    'ALTER TABLE "messages" ADD COLUMN IF NOT EXISTS "search_vector" tsvector '
+    'GENERATED ALWAYS AS (to_tsvector(\'english\', "content")) STORED',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_messages_search_vector" '
+    'ON "messages" USING GIN ("search_vector")',
+    # Scopes of per-space searches: a couple's sessions, a user's messages
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_sessions_couple" '
+    'ON "sessions" ("couple_id") WHERE "couple_id" IS NOT NULL',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_messages_user_created" '
+    'ON "messages" ("user_id", "created_at")',
+]
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    for statement in UPGRADE_STATEMENTS:
+        await db.execute_script(statement)
+    # aerich executes whatever we return; an empty script is rejected by asyncpg
+    return "SELECT 1;"
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_messages_user_created";
+        DROP INDEX IF EXISTS "idx_sessions_couple";
+        DROP INDEX IF EXISTS "idx_messages_search_vector";
+        ALTER TABLE "messages" DROP COLUMN IF EXISTS "search_vector";"""
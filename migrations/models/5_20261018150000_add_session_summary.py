@@ -0,0 +1,15 @@
+from tortoise import BaseDBAsyncClient
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "sessions" ADD "summary" TEXT;
+        ALTER TABLE "sessions" ADD "summary_message_id" INT;
+        ALTER TABLE "sessions" ADD "summary_updated_at" TIMESTAMPTZ;"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        ALTER TABLE "sessions" DROP COLUMN "summary";
+        ALTER TABLE "sessions" DROP COLUMN "summary_message_id";
+        ALTER TABLE "sessions" DROP COLUMN "summary_updated_at";"""
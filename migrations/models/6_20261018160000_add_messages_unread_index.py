@@ -0,0 +1,23 @@
+from tortoise import BaseDBAsyncClient
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+RUN_IN_TRANSACTION = False
+
+UPGRADE_STATEMENTS = [
+    # Receipts only ever touch messages that aren't read yet; keeping read
+    # history out of the index keeps receipt updates cheap in long sessions.
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_messages_session_unread" '
+    'ON "messages" ("session_id", "id") WHERE "message_status" <> \'read\'',
+]
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    for statement in UPGRADE_STATEMENTS:
+        await db.execute_script(statement)
+    # aerich executes whatever we return; an empty script is rejected by asyncpg
+    return "SELECT 1;"
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_messages_session_unread";"""
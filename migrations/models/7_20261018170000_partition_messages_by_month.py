@@ -0,0 +1,85 @@
+from tortoise import BaseDBAsyncClient
+
+# Rebuilds "messages" as a table range-partitioned by month on "created_at".
+# Partitions are named messages_pYYYYMM (UTC months); "messages_default" catches
+# rows outside every partition. partition_service creates future partitions
+# and archives old ones.
+#
+# The copy runs in one transaction and holds an exclusive lock on "messages"
+# until it commits: schedule this migration for a maintenance window.
+#
+# The primary key of a partitioned table must contain the partition key, so it
+# becomes ("id", "created_at"). Ids still come from the same sequence.
+
+MESSAGE_COLUMNS = (
+    '"id", "session_id", "user_id", "content", "sender_type", "message_status", '
+    '"reply_to_message_id", "created_at", "updated_at"'
+)
+
+MESSAGE_INDEXES = """
+        CREATE INDEX "idx_messages_session_created" ON "messages" ("session_id", "created_at");
+        CREATE INDEX "idx_messages_user_created" ON "messages" ("user_id", "created_at");
+        CREATE INDEX "idx_messages_search_vector" ON "messages" USING GIN ("search_vector");
+        CREATE INDEX "idx_messages_session_unread" ON "messages" ("session_id", "id")
+            WHERE "message_status" <> 'read';"""
+
+
+def _messages_table(name: str, primary_key: str, partitioned: bool) -> str:
+    return f"""
+        CREATE TABLE "{name}" (
+            "id" INT NOT NULL DEFAULT nextval('messages_id_seq'),
+            "session_id" INT NOT NULL,
+            "user_id" INT NOT NULL,
+            "content" TEXT NOT NULL,
+            "sender_type" VARCHAR(10) NOT NULL,
+            "message_status" VARCHAR(20) NOT NULL DEFAULT 'sent',
+            "reply_to_message_id" INT,
+            "created_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            "updated_at" TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            "search_vector" tsvector GENERATED ALWAYS AS (to_tsvector('english', "content")) STORED,
+            CONSTRAINT "{name}_pkey" PRIMARY KEY ({primary_key})
+        ){' PARTITION BY RANGE ("created_at")' if partitioned else ''};"""
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    return f"""
+        ALTER SEQUENCE "messages_id_seq" OWNED BY NONE;
+        {_messages_table("messages_partitioned", '"id", "created_at"', partitioned=True)}
+        CREATE TABLE "messages_default" PARTITION OF "messages_partitioned" DEFAULT;
+        DO $$
+        DECLARE month TIMESTAMP;
+        BEGIN
+            FOR month IN SELECT generate_series(
+                date_trunc('month', COALESCE((SELECT MIN("created_at") FROM "messages"), now()) AT TIME ZONE 'UTC'),
+                date_trunc('month', now() AT TIME ZONE 'UTC') + INTERVAL '3 months',
+                INTERVAL '1 month'
+            ) LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF "messages_partitioned" FOR VALUES FROM (%L) TO (%L)',
+                    'messages_p' || to_char(month, 'YYYYMM'),
+                    month AT TIME ZONE 'UTC',
+                    (month + INTERVAL '1 month') AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$;
+        INSERT INTO "messages_partitioned" ({MESSAGE_COLUMNS})
+            SELECT {MESSAGE_COLUMNS} FROM "messages";
+        DROP TABLE "messages";
+        ALTER TABLE "messages_partitioned" RENAME TO "messages";
+        ALTER TABLE "messages" RENAME CONSTRAINT "messages_partitioned_pkey" TO "messages_pkey";
+        ALTER SEQUENCE "messages_id_seq" OWNED BY "messages"."id";
+        {MESSAGE_INDEXES}"""
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    # Partitions archived to disk are not restored; rehydrate them first
+    return f"""
+        ALTER SEQUENCE "messages_id_seq" OWNED BY NONE;
+        {_messages_table("messages_plain", '"id"', partitioned=False)}
+        INSERT INTO "messages_plain" ({MESSAGE_COLUMNS})
+            SELECT {MESSAGE_COLUMNS} FROM "messages";
+        DROP TABLE "messages";
+        ALTER TABLE "messages_plain" RENAME TO "messages";
+        ALTER TABLE "messages" RENAME CONSTRAINT "messages_plain_pkey" TO "messages_pkey";
+        ALTER SEQUENCE "messages_id_seq" OWNED BY "messages"."id";
+        {MESSAGE_INDEXES}"""
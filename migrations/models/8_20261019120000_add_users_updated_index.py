@@ -0,0 +1,19 @@
+from tortoise import BaseDBAsyncClient
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+RUN_IN_TRANSACTION = False
+
+
+async def upgrade(db: BaseDBAsyncClient) -> str:
+    # Backs the email filter refresh (users updated since the last run)
+    await db.execute_script(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "idx_users_updated_at" '
+        'ON "users" ("updated_at")'
+    )
+    # aerich executes whatever we return; an empty script is rejected by asyncpg
+    return "SELECT 1;"
+
+
+async def downgrade(db: BaseDBAsyncClient) -> str:
+    return """
+        DROP INDEX IF EXISTS "idx_users_updated_at";"""